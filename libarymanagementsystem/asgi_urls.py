@@ -0,0 +1,15 @@
+"""
+URL configuration for requests served by the ASGI handler.
+
+The same routes as libarymanagementsystem.urls, except that library pages
+with an async implementation resolve to their async view.
+"""
+from django.contrib import admin
+from django.urls import path, include
+from django.conf import settings
+from django.conf.urls.static import static
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('library.async_urls')),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
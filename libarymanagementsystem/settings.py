@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,16 +43,28 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library.middleware.MetricsMiddleware',
+    'library.middleware.ASGIURLConfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'library.middleware.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'library.middleware.StudentMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'library.middleware.QueryCountMiddleware',
 ]
 
+# Requests running more queries than this, or repeating one query shape
+# this many times, are logged by QueryCountMiddleware.
+QUERY_COUNT_BUDGET = 20
+QUERY_COUNT_REPEAT_THRESHOLD = 5
+
 ROOT_URLCONF = 'libarymanagementsystem.urls'
+# Used for requests served by the ASGI handler; see ASGIURLConfMiddleware.
+ASGI_URLCONF = 'libarymanagementsystem.asgi_urls'
 
 TEMPLATES = [
     {
@@ -78,10 +92,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent checkouts queue on
+            # the busy timeout instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
 
+# The default cache is shared by every worker process when
+# LIBRARY_CACHE_BACKEND names a shared backend, e.g.
+# django.core.cache.backends.redis.RedisCache with LIBRARY_CACHE_LOCATION
+# redis://127.0.0.1:6379/0. Only then are sessions read from the cache and
+# written through to the database, and the User and Student rows behind
+# request.user and request.student cached for ACCOUNT_CACHE_TIMEOUT
+# seconds and dropped whenever they are saved. A per-process LocMemCache
+# would go on serving rows another process had changed, so with the
+# default below both stay in the database.
+LIBRARY_CACHE_BACKEND = os.environ.get('LIBRARY_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+LIBRARY_CACHE_LOCATION = os.environ.get('LIBRARY_CACHE_LOCATION', '')
+if LIBRARY_CACHE_BACKEND.endswith(('.LocMemCache', '.DummyCache')):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# ModelBackend stays listed so sessions it authenticated remain valid.
+AUTHENTICATION_BACKENDS = [
+    'library.accounts.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+ACCOUNT_CACHE_TIMEOUT = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -123,7 +166,58 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Enrollment reports; not served publicly. Defaults to the system temp
+# directory so nothing is written into the source tree.
+ENROLLMENT_DIR = os.environ.get('ENROLLMENT_DIR', os.path.join(tempfile.gettempdir(), 'library-enrollment'))
+
+# Rendered catalog grid pages. LocMemCache evicts least recently used
+# entries past MAX_ENTRIES; point the alias at a shared backend (Redis,
+# Memcached) to share fragments between worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': LIBRARY_CACHE_BACKEND,
+        'LOCATION': LIBRARY_CACHE_LOCATION,
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog-grid',
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+CATALOG_CACHE = 'catalog'
+
+# Per-process metric snapshots merged by /metrics. Every worker process
+# must point at the same directory, e.g. /var/lib/library/metrics; when
+# METRICS_DIR is unset nothing is written and /metrics reports only the
+# process that answers it. Scrapers authenticate with
+# "Authorization: Bearer <METRICS_TOKEN>"; superusers can also browse it.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_FLUSH_INTERVAL = 5
+
+# Read replicas for catalog and reporting reads, routed by
+# library.routers.PrimaryReplicaRouter. LIBRARY_REPLICAS is a
+# comma-separated list of SQLite files kept as copies of the primary by
+# "manage.py sync_replicas"; they are opened read-only. After a write a
+# session reads from the primary for REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get('LIBRARY_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{Path(path).resolve()}?mode=ro',
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['library.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+
+# Loans returned longer ago than this are moved to IssuedBookArchive by
+# "manage.py archive_loans".
+LOAN_ARCHIVE_DAYS = 180
+
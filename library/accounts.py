@@ -0,0 +1,95 @@
+"""Cache the User and Student rows every authenticated request needs.
+
+With a cache-backed session engine this leaves an ordinary page view
+with no session, User or Student query. Both entries are dropped by the
+receivers in library.signals whenever the rows are saved or deleted,
+and expire after ACCOUNT_CACHE_TIMEOUT anyway.
+
+Only a default cache shared by every process is used: with a
+per-process one, a save in one worker could not drop the copies the
+others hold, so the rows are read from the database instead.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .models import Student
+
+# Cached for users without a Student profile, so admins are not looked up on every request.
+NO_STUDENT = 0
+
+
+def user_key(user_id):
+    return f'library:user:{user_id}'
+
+
+def student_key(user_id):
+    return f'library:student:{user_id}'
+
+
+def timeout():
+    return getattr(settings, 'ACCOUNT_CACHE_TIMEOUT', 300)
+
+
+def enabled():
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def invalidate(user_id):
+    cache.delete_many([user_key(user_id), student_key(user_id)])
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose per-request get_user() is served from the cache."""
+
+    def get_user(self, user_id):
+        if not enabled():
+            return super().get_user(user_id)
+        user = cache.get(user_key(user_id))
+        if user is None:
+            try:
+                user = User._default_manager.get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            cache.set(user_key(user_id), user, timeout())
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        if not enabled():
+            return await super().aget_user(user_id)
+        user = await cache.aget(user_key(user_id))
+        if user is None:
+            try:
+                user = await User._default_manager.aget(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            await cache.aset(user_key(user_id), user, timeout())
+        return user if self.user_can_authenticate(user) else None
+
+
+def get_student(user):
+    """The Student profile of user (with user attached), or None."""
+    if not user.is_authenticated:
+        return None
+    if not enabled():
+        return Student.objects.select_related('user').filter(user=user).first()
+    student = cache.get(student_key(user.pk))
+    if student is None:
+        student = Student.objects.select_related('user').filter(user=user).first()
+        cache.set(student_key(user.pk), student or NO_STUDENT, timeout())
+    return student or None
+
+
+async def aget_student(user):
+    if not user.is_authenticated:
+        return None
+    if not enabled():
+        return await Student.objects.select_related('user').filter(user=user).afirst()
+    student = await cache.aget(student_key(user.pk))
+    if student is None:
+        student = await Student.objects.select_related('user').filter(user=user).afirst()
+        await cache.aset(student_key(user.pk), student or NO_STUDENT, timeout())
+    return student or None
@@ -0,0 +1,49 @@
+"""Move old returned loans from IssuedBook into IssuedBookArchive.
+
+IssuedBook then holds open loans and recent returns only, so the
+active-loan queries and their indexes stay small. Each batch is copied
+and deleted in its own short transaction; readers that need the full
+history (issued_books, exports, the student dashboard) read both tables.
+"""
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import IssuedBook, IssuedBookArchive
+
+FIELDS = [
+    'id', 'book_id', 'student_id', 'issued_date', 'due_date',
+    'return_date', 'fine_amount', 'is_returned',
+]
+
+
+def archivable(cutoff):
+    return IssuedBook.objects.filter(is_returned=True, return_date__lt=cutoff)
+
+
+def archive_loans(days=None, batch_size=1000, pause=0, on_batch=None):
+    """Archive loans returned more than days (LOAN_ARCHIVE_DAYS) ago.
+
+    pause seconds are slept between batches to let other writers take the
+    database lock. on_batch(archived) is called after every batch.
+    Returns the number of loans archived.
+    """
+    if days is None:
+        days = settings.LOAN_ARCHIVE_DAYS
+    cutoff = date.today() - timedelta(days=days)
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(archivable(cutoff).order_by('return_date', 'id').values(*FIELDS)[:batch_size])
+            if not rows:
+                break
+            IssuedBookArchive.objects.bulk_create([IssuedBookArchive(**row) for row in rows])
+            IssuedBook.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
+        if on_batch:
+            on_batch(archived)
+        if pause:
+            time.sleep(pause)
+    return archived
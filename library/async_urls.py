@@ -0,0 +1,2 @@
+"""library.urls with the async views, for requests served by the ASGI handler."""
+from .urls import async_urlpatterns as urlpatterns  # noqa: F401
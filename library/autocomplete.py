@@ -0,0 +1,74 @@
+import re
+
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Collate, Upper
+
+from .models import Book, BookReservation, Student
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+ISBN_PREFIX = re.compile(r'^[\d-]+[xX]?$')
+
+
+def prefix_range(field, prefix):
+    # A half-open range on the raw column is an index range scan on every
+    # backend, unlike LIKE 'x%' which SQLite only optimizes for NOCASE columns.
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + '\uffff'}
+
+
+def title_order():
+    # The order of the title index from migration 0013, so the scan can stop at the LIMIT.
+    if connection.vendor == 'sqlite':
+        return Collate('title', 'NOCASE')
+    return Upper('title')
+
+
+def suggest_books(query, limit=DEFAULT_LIMIT):
+    """Issuable books whose ISBN or title starts with query.
+
+    Both are index range scans read in index order, so a keystroke costs
+    about limit rows however many titles share the prefix.
+    """
+    query = query.strip()
+    # Books whose only free copies are on hold still have to be issuable
+    # to the students holding them.
+    held = BookReservation.objects.filter(book=OuterRef('pk'), status=BookReservation.HELD)
+    books = Book.objects.filter(Q(available_copies__gt=0) | Exists(held))
+    if ISBN_PREFIX.match(query):
+        books = books.filter(**prefix_range('isbn', query.replace('-', '').upper())).order_by('isbn')
+    else:
+        books = books.filter(title__istartswith=query).order_by(title_order(), 'id')
+    return [
+        {
+            'id': book.id,
+            'isbn': book.isbn,
+            'title': book.title,
+            'author': book.author,
+            'available_copies': book.available_copies,
+        }
+        for book in books.only('id', 'isbn', 'title', 'author', 'available_copies')[:limit]
+    ]
+
+
+def suggest_students(query, limit=DEFAULT_LIMIT):
+    """Active students whose student ID, first name or last name starts with query.
+
+    Each column is probed separately so every probe is an index range scan;
+    the results are merged in student_id order.
+    """
+    query = query.strip()
+    students = Student.objects.filter(is_active=True).select_related('user').order_by('student_id')
+    matches = {}
+    for lookup in ('student_id__istartswith', 'user__first_name__istartswith', 'user__last_name__istartswith'):
+        for student in students.filter(**{lookup: query})[:limit]:
+            matches[student.pk] = student
+    return [
+        {
+            'student_id': student.student_id,
+            'name': student.user.get_full_name(),
+            'department': student.department,
+        }
+        for student in sorted(matches.values(), key=lambda student: student.student_id)[:limit]
+    ]
@@ -0,0 +1,98 @@
+"""In-process HTTP load helpers shared by the benchmark commands.
+
+Requests go straight into Django's WSGI/ASGI handlers, so no server or
+load-testing tool is needed and the numbers measure the application
+(middleware, views, ORM, templates) rather than the network.
+"""
+import asyncio
+import time
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.utils.module_loading import import_string
+
+
+def session_cookie(user):
+    """A Cookie header value logging requests in as user."""
+    session = import_string(f'{settings.SESSION_ENGINE}.SessionStore')()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+def wsgi_get(handler, target, cookie=''):
+    """GET target through a WSGIHandler; returns (seconds, status code)."""
+    url = urlsplit(target)
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': url.path, 'QUERY_STRING': url.query,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'HTTP_COOKIE': cookie, 'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    started = time.perf_counter()
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return time.perf_counter() - started, int(statuses[0].split()[0])
+
+
+async def asgi_get(handler, target, cookie=''):
+    """GET target through an ASGIHandler; returns (seconds, status code)."""
+    url = urlsplit(target)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(),
+        'query_string': url.query.encode(), 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    done = asyncio.Event()
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            done.set()
+
+    started = time.perf_counter()
+    await handler(scope, receive, send)
+    return time.perf_counter() - started, status
+
+
+def summarize(results, elapsed):
+    """Throughput and latency percentiles (ms) for a list of (seconds, status)."""
+    latencies = sorted(latency for latency, _ in results)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 2)
+
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, status in results if status is None or status >= 400),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(results) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+    }
@@ -0,0 +1,77 @@
+"""Cache of rendered catalog grid fragments, keyed on the catalog version.
+
+The version is a StatCounter row bumped in the same transaction as any
+change to a book, its available copies or its waitlist (see
+stats.increment, the Book signals and circulation), so invalidating every cached page is one UPDATE and a
+cached fragment can never outlive the data it was rendered from; old
+versions simply stop being requested and age out of the LRU. Fragments
+live in the CATALOG_CACHE cache alias, which is a bounded local-memory
+cache by default and can point at any Django cache backend.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics, stats
+from .models import StatCounter
+
+HITS = 'library_catalog_cache_hits_total'
+MISSES = 'library_catalog_cache_misses_total'
+
+
+def cache():
+    return caches[getattr(settings, 'CATALOG_CACHE', 'default')]
+
+
+def version():
+    value = StatCounter.objects.filter(name=StatCounter.CATALOG_VERSION).values_list('value', flat=True).first()
+    if value is None:
+        value = StatCounter.objects.get_or_create(name=StatCounter.CATALOG_VERSION)[0].value
+    return value
+
+
+async def aversion():
+    value = await StatCounter.objects.filter(
+        name=StatCounter.CATALOG_VERSION
+    ).values_list('value', flat=True).afirst()
+    if value is None:
+        value = await sync_to_async(version)()
+    return value
+
+
+def bump():
+    stats.increment({StatCounter.CATALOG_VERSION: 1})
+
+
+def grid_key(version, *parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'catalog-grid:{version}:{digest}'
+
+
+def get(key):
+    fragment = cache().get(key)
+    metrics.inc(MISSES if fragment is None else HITS)
+    return fragment
+
+
+def set(key, fragment):
+    cache().set(key, fragment)
+
+
+async def aget(key):
+    fragment = await cache().aget(key)
+    metrics.inc(MISSES if fragment is None else HITS)
+    return fragment
+
+
+async def aset(key, fragment):
+    await cache().aset(key, fragment)
+
+
+def hit_ratio():
+    """This process's hit ratio, or None before the first lookup."""
+    counters = metrics.counter_values()
+    lookups = counters[HITS] + counters[MISSES]
+    return counters[HITS] / lookups if lookups else None
@@ -0,0 +1,370 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .fines import fine_for
+from . import catalog_cache, reports, stats, summaries
+from .models import Book, BookReservation, IssuedBook, StatCounter
+
+
+class CirculationError(Exception):
+    pass
+
+
+class NoCopiesAvailable(CirculationError):
+    pass
+
+
+class AlreadyReturned(CirculationError):
+    pass
+
+
+class AlreadyReserved(CirculationError):
+    pass
+
+
+class CopiesOnLoan(CirculationError):
+    pass
+
+
+def checkout(book, student, days=14):
+    """Issue one copy of book to student.
+
+    The availability check and the decrement are a single conditional
+    UPDATE, so concurrent checkouts of the last copy cannot both succeed.
+    A copy held for the student's reservation is used first; it already
+    left available_copies when the hold was placed.
+    """
+    due_date = datetime.now().date() + timedelta(days=days)
+    with transaction.atomic():
+        fulfilled = BookReservation.objects.filter(
+            book=book, student=student, status=BookReservation.HELD
+        ).update(status=BookReservation.FULFILLED, is_active=False)
+        if fulfilled:
+            stats.increment({StatCounter.ACTIVE_LOANS: 1})
+        else:
+            claimed = Book.objects.filter(pk=book.pk, available_copies__gt=0).update(
+                available_copies=F('available_copies') - 1
+            )
+            if not claimed:
+                raise NoCopiesAvailable(book)
+            stats.increment({StatCounter.ACTIVE_LOANS: 1, StatCounter.AVAILABLE_COPIES: -1})
+        issued_book = IssuedBook.objects.create(book=book, student=student, due_date=due_date)
+        summaries.refresh(student.pk)
+        reports.record(issued=[issued_book.pk])
+        return issued_book
+
+
+def return_book(issued_book):
+    """Mark a loan returned, settle its fine and pass the copy to the waitlist or the shelf."""
+    today = datetime.now().date()
+    fine = fine_for(issued_book.due_date, today)
+    with transaction.atomic():
+        closed = IssuedBook.objects.filter(pk=issued_book.pk, is_returned=False).update(
+            is_returned=True, return_date=today, fine_amount=fine
+        )
+        if not closed:
+            raise AlreadyReturned(issued_book)
+        shelved = allocate(issued_book.book_id, 1, timezone.now())
+        stats.increment({StatCounter.ACTIVE_LOANS: -1, StatCounter.AVAILABLE_COPIES: shelved})
+        summaries.refresh(issued_book.student_id)
+        reports.record(returned=[issued_book.pk])
+    issued_book.is_returned = True
+    issued_book.return_date = today
+    issued_book.fine_amount = fine
+    return issued_book
+
+
+def set_total_copies(book, total_copies, catalog=True):
+    """Change how many copies of book the library owns to total_copies.
+
+    The change is applied as a delta to both copy counts, so loans and
+    holds taken since book was read are kept, and removing copies is a
+    conditional UPDATE that refuses to go below the copies that are out.
+    Added copies go to the waitlist first. Call inside a transaction.
+    """
+    delta = total_copies - book.total_copies
+    if delta > 0:
+        Book.objects.filter(pk=book.pk).update(total_copies=F('total_copies') + delta)
+        shelved = allocate(book.pk, delta, timezone.now())
+    elif delta < 0:
+        removed = Book.objects.filter(pk=book.pk, available_copies__gte=-delta).update(
+            total_copies=F('total_copies') + delta, available_copies=F('available_copies') + delta
+        )
+        if not removed:
+            raise CopiesOnLoan(book)
+        shelved = delta
+    else:
+        return
+    stats.increment({StatCounter.AVAILABLE_COPIES: shelved}, catalog=catalog)
+
+
+def checkout_cart(student, isbns, days=14):
+    """Issue every scanned ISBN in isbns to student in one transaction.
+
+    The books are resolved and locked with one query, holds for the
+    student are used first, and the loans, holds and copy counts are
+    written with one statement each however long the cart is. Scanning
+    a title twice issues two copies. Returns one result dict per ISBN,
+    in order; items that cannot be issued do not stop the others.
+    """
+    due_date = datetime.now().date() + timedelta(days=days)
+    wanted = Counter(isbns)
+    with transaction.atomic():
+        books = {book.isbn: book for book in Book.objects.select_for_update().filter(isbn__in=wanted)}
+        holds = {}
+        for pk, book_id in (
+            BookReservation.objects.filter(
+                student=student, status=BookReservation.HELD, book__in=books.values()
+            ).values_list('pk', 'book_id')
+        ):
+            holds.setdefault(book_id, []).append(pk)
+
+        results, loans, used_holds, claimed = [], [], [], Counter()
+        for isbn in isbns:
+            book = books.get(isbn)
+            if book is None:
+                results.append({'isbn': isbn, 'status': 'error', 'error': "Unknown ISBN."})
+            elif holds.get(book.pk):
+                used_holds.append(holds[book.pk].pop())
+                loans.append(IssuedBook(book=book, student=student, due_date=due_date))
+                results.append({'isbn': isbn, 'status': 'issued'})
+            elif claimed[book.pk] < book.available_copies:
+                claimed[book.pk] += 1
+                loans.append(IssuedBook(book=book, student=student, due_date=due_date))
+                results.append({'isbn': isbn, 'status': 'issued'})
+            else:
+                results.append({'isbn': isbn, 'status': 'error', 'error': "No copies available."})
+
+        if used_holds:
+            BookReservation.objects.filter(pk__in=used_holds).update(
+                status=BookReservation.FULFILLED, is_active=False
+            )
+        if claimed:
+            Book.objects.filter(pk__in=claimed).update(available_copies=Case(
+                *[When(pk=pk, then=F('available_copies') - n) for pk, n in claimed.items()]
+            ))
+        if loans:
+            loans = IssuedBook.objects.bulk_create(loans)
+            stats.increment({
+                StatCounter.ACTIVE_LOANS: len(loans),
+                StatCounter.AVAILABLE_COPIES: -sum(claimed.values()),
+            })
+            summaries.refresh(student.pk)
+            reports.record(issued=[loan.pk for loan in loans])
+
+    issued = iter(loans)
+    for result in results:
+        if result['status'] == 'issued':
+            loan = next(issued)
+            result.update(issue_id=loan.pk, title=loan.book.title, due_date=due_date)
+    return results
+
+
+def return_cart(issue_ids):
+    """Return every loan in issue_ids in one transaction.
+
+    The loans are closed with one UPDATE that sets each fine, copies go
+    back on the shelf with one more, and only books with a waitlist are
+    passed through allocate(). Returns one result dict per issue id, in
+    order.
+    """
+    today = datetime.now().date()
+    now = timezone.now()
+    with transaction.atomic():
+        loans = {
+            loan.pk: loan
+            for loan in IssuedBook.objects.select_for_update().filter(pk__in=issue_ids).select_related('book')
+        }
+        results, closing = [], {}
+        for issue_id in issue_ids:
+            loan = loans.get(issue_id)
+            if loan is None:
+                results.append({'issue_id': issue_id, 'status': 'error', 'error': "Unknown loan."})
+            elif loan.is_returned or issue_id in closing:
+                results.append({'issue_id': issue_id, 'status': 'error', 'error': "Already returned."})
+            else:
+                closing[issue_id] = fine_for(loan.due_date, today)
+                results.append({
+                    'issue_id': issue_id, 'status': 'returned',
+                    'title': loan.book.title, 'fine_amount': closing[issue_id],
+                })
+        if not closing:
+            return results
+
+        IssuedBook.objects.filter(pk__in=closing, is_returned=False).update(
+            is_returned=True,
+            return_date=today,
+            fine_amount=Case(*[When(pk=pk, then=Value(fine)) for pk, fine in closing.items()]),
+        )
+        copies = Counter(loans[pk].book_id for pk in closing)
+        queued = set(
+            BookReservation.objects.filter(book_id__in=copies, status=BookReservation.WAITING)
+            .order_by().values_list('book_id', flat=True).distinct()
+        )
+        shelved = sum(allocate(book_id, copies.pop(book_id), now) for book_id in queued)
+        if copies:
+            Book.objects.filter(pk__in=copies).update(available_copies=Case(
+                *[When(pk=pk, then=F('available_copies') + n) for pk, n in copies.items()]
+            ))
+            shelved += sum(copies.values())
+        stats.increment({StatCounter.ACTIVE_LOANS: -len(closing), StatCounter.AVAILABLE_COPIES: shelved})
+        summaries.refresh(*{loans[pk].student_id for pk in closing})
+        reports.record(returned=list(closing))
+    return results
+
+
+def reserve(book, student):
+    """Reserve book for student.
+
+    If a copy is on the shelf and nobody is queued for it, the copy is held
+    for HOLD_DAYS straight away; otherwise the student joins the back of
+    the book's waitlist for up to WAITLIST_DAYS.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if BookReservation.objects.filter(book=book, student=student, is_active=True).exists():
+            raise AlreadyReserved(book)
+        queued = BookReservation.objects.filter(book=book, status=BookReservation.WAITING).exists()
+        claimed = not queued and Book.objects.filter(pk=book.pk, available_copies__gt=0).update(
+            available_copies=F('available_copies') - 1
+        )
+        if claimed:
+            stats.increment({StatCounter.AVAILABLE_COPIES: -1})
+            status, days = BookReservation.HELD, BookReservation.HOLD_DAYS
+        else:
+            # The catalog shows each book's waitlist length.
+            catalog_cache.bump()
+            status, days = BookReservation.WAITING, BookReservation.WAITLIST_DAYS
+        reservation = BookReservation.objects.create(
+            book=book, student=student, status=status, expiry_date=now + timedelta(days=days),
+        )
+        summaries.refresh(student.pk)
+        return reservation
+
+
+def with_queue_position(reservations):
+    """Annotate queue_position: how many waiting reservations for the same book are ahead."""
+    ahead = BookReservation.objects.filter(
+        book=OuterRef('book'), status=BookReservation.WAITING, reservation_date__lt=OuterRef('reservation_date'),
+    ).order_by().values('book').annotate(n=Count('id')).values('n')
+    return reservations.annotate(queue_position=Coalesce(Subquery(ahead), 0) + 1)
+
+
+def with_waitlist(books):
+    """Annotate waitlist: how many reservations are waiting for each book."""
+    waiting = BookReservation.objects.filter(
+        book=OuterRef('pk'), status=BookReservation.WAITING,
+    ).order_by().values('book').annotate(n=Count('id')).values('n')
+    return books.annotate(waitlist=Coalesce(Subquery(waiting), 0))
+
+
+def allocate(book_id, copies, now):
+    """Hold freed copies of a book for the head of its waitlist.
+
+    The head is read in FIFO order straight off reservation_queue_idx.
+    Copies nobody is waiting for go back on the shelf; returns how many.
+    Call inside the transaction that freed the copies.
+    """
+    head = list(
+        BookReservation.objects.select_for_update(skip_locked=True)
+        .filter(book_id=book_id, status=BookReservation.WAITING)
+        .order_by('reservation_date', 'id')
+        .values_list('pk', flat=True)[:copies]
+    )
+    held = 0
+    if head:
+        held = BookReservation.objects.filter(pk__in=head, status=BookReservation.WAITING).update(
+            status=BookReservation.HELD, expiry_date=now + timedelta(days=BookReservation.HOLD_DAYS)
+        )
+        if held:
+            catalog_cache.bump()
+    shelved = copies - held
+    if shelved:
+        Book.objects.filter(pk=book_id).update(available_copies=F('available_copies') + shelved)
+    return shelved
+
+
+def release_holds(reservations, status, now=None):
+    """End the held reservations among reservations, passing each copy down its waitlist.
+
+    Returns the number of holds released.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        holds = reservations.filter(status=BookReservation.HELD)
+        per_book = dict(holds.order_by().values('book_id').annotate(n=Count('id')).values_list('book_id', 'n'))
+        if not per_book:
+            return 0
+        holders = set(holds.values_list('student_id', flat=True))
+        holds.update(status=status, is_active=False)
+        shelved = sum(allocate(book_id, n, now) for book_id, n in per_book.items())
+        stats.increment({StatCounter.AVAILABLE_COPIES: shelved})
+        summaries.refresh(*holders)
+    return sum(per_book.values())
+
+
+def fill_holds(now=None):
+    """Hold shelved copies for students still queued for them.
+
+    Normally a no-op; it picks up queues that predate the waitlist and
+    copies shelved by a return that lost a race for the head reservation.
+    """
+    now = now or timezone.now()
+    filled = 0
+    book_ids = (
+        BookReservation.objects.filter(status=BookReservation.WAITING, book__available_copies__gt=0)
+        .order_by().values_list('book_id', flat=True).distinct()
+    )
+    for book_id in list(book_ids):
+        with transaction.atomic():
+            available = Book.objects.filter(pk=book_id).values_list('available_copies', flat=True).first() or 0
+            head = list(
+                BookReservation.objects.filter(book_id=book_id, status=BookReservation.WAITING)
+                .order_by('reservation_date', 'id').values_list('pk', flat=True)[:available]
+            )
+            if not head:
+                continue
+            claimed = Book.objects.filter(pk=book_id, available_copies__gte=len(head)).update(
+                available_copies=F('available_copies') - len(head)
+            )
+            if not claimed:
+                continue
+            BookReservation.objects.filter(pk__in=head).update(
+                status=BookReservation.HELD, expiry_date=now + timedelta(days=BookReservation.HOLD_DAYS)
+            )
+            stats.increment({StatCounter.AVAILABLE_COPIES: -len(head)})
+            filled += len(head)
+    return filled
+
+
+def expire_reservations(now=None, batch_size=500):
+    """Expire reservations past expiry_date and hand lapsed holds to the next in line.
+
+    Waiting reservations are expired with one UPDATE; lapsed holds are
+    released batch_size at a time. Returns (expired, released, filled).
+    """
+    now = now or timezone.now()
+    lapsed = BookReservation.objects.filter(status=BookReservation.WAITING, expiry_date__lt=now)
+    with transaction.atomic():
+        students = set(lapsed.values_list('student_id', flat=True))
+        expired = lapsed.update(status=BookReservation.EXPIRED, is_active=False)
+        if expired:
+            catalog_cache.bump()
+        summaries.refresh(*students)
+
+    released = 0
+    while True:
+        batch = list(
+            BookReservation.objects.filter(status=BookReservation.HELD, expiry_date__lt=now)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        released += release_holds(BookReservation.objects.filter(pk__in=batch), BookReservation.EXPIRED, now)
+
+    return expired, released, fill_holds(now)
@@ -0,0 +1,63 @@
+"""Conditional GET for pages derived from the catalog counters.
+
+The ETag of a page is a digest of a cheap change marker (the catalog
+version, or every StatCounter row), the query string and who is asking,
+so a client revalidating an unchanged page gets 304 Not Modified
+before the view runs any listing query or renders a template. ETags
+are weak because the rendered HTML embeds a freshly masked CSRF token.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from . import catalog_cache, stats
+from .models import StatCounter
+
+
+def catalog_version(request):
+    return catalog_cache.version()
+
+
+def counters(request):
+    names = [*stats.COUNTERS, StatCounter.CATALOG_VERSION]
+    return sorted(StatCounter.objects.filter(name__in=names).values_list('name', 'value'))
+
+
+def page_etag(request, marker):
+    # A pending flash message changes the page without changing the data.
+    if request.method not in ('GET', 'HEAD') or messages.get_messages(request):
+        return None
+    user = request.user
+    parts = (marker(request), request.GET.urlencode(), user.pk, user.is_superuser)
+    return f'W/"{hashlib.sha1(repr(parts).encode()).hexdigest()[:24]}"'
+
+
+def _respond(request, etag, response):
+    if etag and response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        # Always revalidate; the page differs per user.
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def etag(marker):
+    """Answer a GET with 304 while marker(request), the query and the user are unchanged."""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                request.user = await request.auser()
+                etag = await sync_to_async(page_etag)(request, marker)
+                response = etag and get_conditional_response(request, etag=etag)
+                return _respond(request, etag, response or await view(request, *args, **kwargs))
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                etag = page_etag(request, marker)
+                response = etag and get_conditional_response(request, etag=etag)
+                return _respond(request, etag, response or view(request, *args, **kwargs))
+        return inner
+    return decorator
@@ -0,0 +1,285 @@
+"""Deterministic synthetic catalog, students and circulation history.
+
+Everything is drawn from a random.Random seeded by the caller, so the
+same seed and sizes always produce the same rows. Rows are written with
+bulk_create in fixed-size batches; auto_now_add is switched off while
+generating so added_date, registration_date and issued_date can be
+spread over the simulated history instead of all being "now".
+"""
+import random
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import reports, stats, summaries
+from .models import Book, BookReservation, IssuedBook, StatCounter, Student
+
+WORDS = (
+    "history light shadow river empire garden silent machine winter ocean stone city "
+    "secret modern ancient theory practice journey kingdom science mind market design "
+    "war peace code data world life art music power glass road fire water star"
+).split()
+FIRST_NAMES = (
+    "Aarav Aditi Ananya Arjun Diya Ishaan Kavya Meera Neha Priya Rahul Riya Rohan "
+    "Saanvi Sahil Tara Vihaan Zara Alex Maria John Sara Omar Lena"
+).split()
+LAST_NAMES = (
+    "Sharma Patel Reddy Nair Iyer Gupta Khan Das Rao Menon Singh Joshi Smith Garcia "
+    "Chen Kumar Mehta Bose Pillai Varma"
+).split()
+PUBLISHERS = ["Penguin", "HarperCollins", "O'Reilly", "Springer", "Macmillan", "Wiley", "Pearson"]
+DEPARTMENTS = ["Computer Science", "Physics", "Mathematics", "History", "Economics", "Biology", "Arts"]
+CATEGORY_WEIGHTS = {
+    'Fiction': 25, 'Non-Fiction': 10, 'Science': 12, 'Technology': 15, 'History': 8,
+    'Biography': 6, 'Self-Help': 6, 'Business': 8, 'Arts': 5, 'Other': 5,
+}
+
+LOAN_DAYS = 14
+
+
+@contextmanager
+def historical_dates(*fields):
+    """Let bulk_create keep explicit values for auto_now_add fields."""
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+# Digits between the 979 prefix and the check digit: a block chosen by the
+# generator prefix, then the book number.
+ISBN_BODY = 9
+
+
+class GenerationError(Exception):
+    pass
+
+
+def isbn_block(prefix, total):
+    """(block, width) for numbering total books 979<block><number:0{width}d>.
+
+    The number field is as wide as total needs; the block takes the
+    remaining digits and is derived from prefix, so different prefixes
+    usually, but not always, get disjoint ranges.
+    """
+    width = max(6, len(str(total - 1)))
+    if width >= ISBN_BODY:
+        raise GenerationError(f"{total} books do not fit in one ISBN-13 range")
+    block_width = ISBN_BODY - width
+    return f'{zlib.crc32(prefix.encode()) % 10 ** block_width:0{block_width}d}', width
+
+
+def isbn13(block, width, number):
+    digits = f'979{block}{number:0{width}d}'
+    check = (10 - sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(digits)) % 10) % 10
+    return f'{digits}{check}'
+
+
+def _pks(model, objs, unique_field):
+    """Primary keys of bulk-created objs, looked up on backends that do not return them."""
+    if all(obj.pk is not None for obj in objs):
+        return [obj.pk for obj in objs]
+    values = [getattr(obj, unique_field) for obj in objs]
+    pks = dict(model.objects.filter(**{f'{unique_field}__in': values}).values_list(unique_field, 'pk'))
+    return [pks[value] for value in values]
+
+
+def _moment(day, rng):
+    return timezone.make_aware(datetime.combine(day, time(rng.randrange(9, 20), rng.randrange(60))))
+
+
+class Generator:
+    """Generate books, students and loan/reservation history in batches.
+
+    Book popularity is heavily skewed (a few titles take most loans) and a
+    loan only stays open while its book has a copy to spare, so
+    available_copies is always total_copies minus open loans.
+    """
+
+    def __init__(self, seed=0, prefix='gen', today=None, days=365, batch_size=5000, on_progress=None):
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.today = today or date.today()
+        self.days = days
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.book_ids = []
+        self.book_copies = []
+        self.student_ids = []
+
+    def progress(self, label, done, total):
+        if self.on_progress:
+            self.on_progress(label, done, total)
+
+    def run(self, books, students, loans, reservations):
+        self.generate_books(books)
+        self.generate_students(students)
+        self.generate_loans(loans)
+        self.generate_reservations(reservations)
+        summaries.rebuild()
+        reports.rebuild()
+        with transaction.atomic():
+            stats.rebuild()
+            # bulk_create sends no signals, so cached catalog pages need an explicit bump.
+            stats.increment({StatCounter.CATALOG_VERSION: 1})
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def generate_books(self, total):
+        block, width = isbn_block(self.prefix, total)
+        first, last = isbn13(block, width, 0), isbn13(block, width, max(total - 1, 0))
+        # Compare without check digits: any ISBN in the range would collide.
+        if Book.objects.filter(isbn__gte=first[:-1], isbn__lte=last[:-1] + '9').exists():
+            raise GenerationError(
+                f"ISBNs {first} to {last} for prefix {self.prefix!r} are already in use; pass another --prefix."
+            )
+        rng = self.rng
+        categories = list(CATEGORY_WEIGHTS)
+        weights = list(CATEGORY_WEIGHTS.values())
+        field = Book._meta.get_field('added_date')
+        with historical_dates(field):
+            for batch in self.batches(total):
+                rows = []
+                for i in batch:
+                    copies = rng.choice((1, 1, 2, 2, 3, 5, 10))
+                    rows.append(Book(
+                        isbn=isbn13(block, width, i),
+                        title=' '.join(rng.sample(WORDS, rng.randrange(2, 5))).title(),
+                        author=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                        category=rng.choices(categories, weights)[0],
+                        publisher=rng.choice(PUBLISHERS),
+                        publication_date=date(rng.randrange(1950, self.today.year + 1), rng.randrange(1, 13), 1),
+                        total_copies=copies,
+                        available_copies=copies,
+                        description=' '.join(rng.choices(WORDS, k=rng.randrange(10, 40))).capitalize() + '.',
+                        added_date=_moment(self.today - timedelta(days=rng.randrange(5 * 365)), rng),
+                    ))
+                with transaction.atomic():
+                    created = Book.objects.bulk_create(rows)
+                self.book_ids.extend(_pks(Book, created, 'isbn'))
+                self.book_copies.extend(book.total_copies for book in created)
+                self.progress('books', batch.stop, total)
+
+    def generate_students(self, total):
+        rng = self.rng
+        password = make_password('password')
+        field = Student._meta.get_field('registration_date')
+        with historical_dates(field):
+            for batch in self.batches(total):
+                users, students = [], []
+                for i in batch:
+                    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                    username = f'{self.prefix}{i:07d}'
+                    users.append(User(
+                        username=username, password=password, first_name=first, last_name=last,
+                        email=f'{username}@example.com',
+                    ))
+                    students.append(Student(
+                        student_id=f'{self.prefix.upper()}{i:07d}',
+                        phone=f'9{rng.randrange(10 ** 9):09d}',
+                        address=f'{rng.randrange(1, 500)} {rng.choice(WORDS).title()} Street',
+                        department=rng.choice(DEPARTMENTS),
+                        year=rng.randrange(1, 5),
+                        is_active=rng.random() > 0.05,
+                        registration_date=_moment(self.today - timedelta(days=rng.randrange(4 * 365)), rng),
+                    ))
+                with transaction.atomic():
+                    users = User.objects.bulk_create(users)
+                    for user, pk in zip(users, _pks(User, users, 'username')):
+                        user.pk = pk
+                    for user, student in zip(users, students):
+                        student.user = user
+                    created = Student.objects.bulk_create(students)
+                self.student_ids.extend(_pks(Student, created, 'student_id'))
+                self.progress('students', batch.stop, total)
+
+    def popular_book(self):
+        # Roughly Zipfian: the first few percent of titles take most loans.
+        count = len(self.book_ids)
+        return min(count - 1, int(count * self.rng.random() ** 4))
+
+    def generate_loans(self, total):
+        if not self.book_ids or not self.student_ids:
+            return
+        rng = self.rng
+        open_loans = {}
+        field = IssuedBook._meta.get_field('issued_date')
+        with historical_dates(field):
+            for batch in self.batches(total):
+                rows = []
+                for _ in batch:
+                    index = self.popular_book()
+                    issued = self.today - timedelta(days=rng.randrange(self.days))
+                    due = issued + timedelta(days=LOAN_DAYS)
+                    # Most loans come back on time, a tail comes back late.
+                    returned = issued + timedelta(days=int(rng.expovariate(1 / 10)) + 1)
+                    is_open = returned > self.today and open_loans.get(index, 0) < self.book_copies[index]
+                    if is_open:
+                        open_loans[index] = open_loans.get(index, 0) + 1
+                        fine = max(0, (self.today - due).days) * IssuedBook.FINE_PER_DAY
+                    else:
+                        returned = min(returned, self.today)
+                        fine = max(0, (returned - due).days) * IssuedBook.FINE_PER_DAY
+                    rows.append(IssuedBook(
+                        book_id=self.book_ids[index],
+                        student_id=rng.choice(self.student_ids),
+                        issued_date=_moment(issued, rng),
+                        due_date=due,
+                        return_date=None if is_open else returned,
+                        fine_amount=Decimal(fine),
+                        is_returned=not is_open,
+                    ))
+                with transaction.atomic():
+                    IssuedBook.objects.bulk_create(rows)
+                self.progress('loans', batch.stop, total)
+
+        # Only books with open loans change, which keeps the FTS update
+        # triggers from firing for the whole catalog.
+        open_count = IssuedBook.objects.filter(
+            book=OuterRef('pk'), is_returned=False
+        ).order_by().values('book').annotate(n=Count('id')).values('n')
+        with transaction.atomic():
+            Book.objects.filter(pk__in=[self.book_ids[index] for index in open_loans]).update(
+                available_copies=F('total_copies') - Coalesce(Subquery(open_count), 0)
+            )
+
+    def generate_reservations(self, total):
+        if not self.book_ids or not self.student_ids:
+            return
+        rng = self.rng
+        field = BookReservation._meta.get_field('reservation_date')
+        with historical_dates(field):
+            for batch in self.batches(total):
+                rows = []
+                for _ in batch:
+                    age = rng.randrange(self.days)
+                    reserved = _moment(self.today - timedelta(days=age), rng)
+                    waiting = age < BookReservation.WAITLIST_DAYS and rng.random() < 0.3
+                    status = BookReservation.WAITING if waiting else rng.choice(
+                        (BookReservation.FULFILLED, BookReservation.FULFILLED, BookReservation.EXPIRED)
+                    )
+                    rows.append(BookReservation(
+                        book_id=self.book_ids[self.popular_book()],
+                        student_id=rng.choice(self.student_ids),
+                        reservation_date=reserved,
+                        expiry_date=reserved + timedelta(days=BookReservation.WAITLIST_DAYS),
+                        status=status,
+                        is_active=waiting,
+                    ))
+                with transaction.atomic():
+                    BookReservation.objects.bulk_create(rows)
+                self.progress('reservations', batch.stop, total)
@@ -0,0 +1,187 @@
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from . import stats
+from .hashing import hash_password, init_worker
+from .models import StatCounter, Student
+
+REQUIRED_FIELDS = ['username', 'student_id', 'first_name', 'last_name', 'department', 'year']
+
+
+class InvalidRow(Exception):
+    pass
+
+
+def read_roster(handle, fmt='csv'):
+    if fmt == 'jsonl':
+        for line in handle:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield InvalidRow(f"invalid JSON: {e}")
+    else:
+        yield from csv.DictReader(handle)
+
+
+def hash_passwords(passwords, pool, workers):
+    chunksize = max(1, len(passwords) // (4 * workers))
+    return list(pool.map(hash_password, passwords, chunksize=chunksize))
+
+
+def validate(row):
+    if isinstance(row, InvalidRow):
+        raise row
+    if not isinstance(row, dict):
+        raise InvalidRow("row is not an object")
+    missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or '').strip()]
+    if missing:
+        raise InvalidRow(f"missing {', '.join(missing)}")
+    try:
+        year = int(row['year'])
+    except (TypeError, ValueError):
+        raise InvalidRow(f"invalid year {row['year']!r}")
+    return {
+        'username': str(row['username']).strip()[:150],
+        'email': str(row.get('email') or '').strip(),
+        'password': row.get('password') or None,
+        'first_name': str(row['first_name']).strip()[:150],
+        'last_name': str(row['last_name']).strip()[:150],
+        'student_id': str(row['student_id']).strip()[:20],
+        'phone': str(row.get('phone') or '').strip()[:15],
+        'address': str(row.get('address') or '').strip(),
+        'department': str(row['department']).strip()[:100],
+        'year': year,
+    }
+
+
+class Enrollment:
+    """Bulk-create students from roster rows.
+
+    Password hashing, which dominates the cost, fans out over a process
+    pool; each chunk of rows is then written with two bulk_create calls in
+    one transaction. Rows that are invalid or that duplicate a username or
+    student_id (in the file or in the database) are passed to on_reject
+    rather than aborting the run.
+    """
+
+    def __init__(self, chunk_size=1000, workers=None, on_reject=None, on_chunk=None):
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.on_reject = on_reject
+        self.on_chunk = on_chunk
+        self.seen_usernames = set()
+        self.seen_student_ids = set()
+        self.processed = self.created = self.rejected = 0
+
+    def run(self, rows):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=init_worker) as pool:
+            chunk = []
+            for line_number, row in enumerate(rows, start=1):
+                self.processed += 1
+                try:
+                    chunk.append((line_number, validate(row)))
+                except InvalidRow as e:
+                    self.reject(line_number, row, str(e))
+                if len(chunk) >= self.chunk_size:
+                    self.enroll_chunk(chunk, pool)
+                    chunk = []
+            if chunk:
+                self.enroll_chunk(chunk, pool)
+        return self.processed, self.created, self.rejected
+
+    def reject(self, line_number, row, reason):
+        self.rejected += 1
+        if self.on_reject:
+            if isinstance(row, dict):
+                row = {key: value for key, value in row.items() if key != 'password'}
+            else:
+                row = None
+            self.on_reject(line_number, row, reason)
+
+    def enroll_chunk(self, chunk, pool):
+        usernames = [row['username'] for _, row in chunk]
+        student_ids = [row['student_id'] for _, row in chunk]
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_student_ids = set(
+            Student.objects.filter(student_id__in=student_ids).values_list('student_id', flat=True)
+        )
+
+        accepted = []
+        for line_number, row in chunk:
+            if row['username'] in taken_usernames or row['username'] in self.seen_usernames:
+                self.reject(line_number, row, f"duplicate username {row['username']!r}")
+            elif row['student_id'] in taken_student_ids or row['student_id'] in self.seen_student_ids:
+                self.reject(line_number, row, f"duplicate student_id {row['student_id']!r}")
+            else:
+                self.seen_usernames.add(row['username'])
+                self.seen_student_ids.add(row['student_id'])
+                accepted.append((line_number, row))
+        if not accepted:
+            return
+
+        hashes = hash_passwords([row['password'] for _, row in accepted], pool, self.workers)
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=row['username'], email=row['email'], password=password,
+                        first_name=row['first_name'], last_name=row['last_name'],
+                    )
+                    for (_, row), password in zip(accepted, hashes)
+                ])
+                if any(user.pk is None for user in users):
+                    ids = dict(
+                        User.objects.filter(username__in=[user.username for user in users])
+                        .values_list('username', 'pk')
+                    )
+                    for user in users:
+                        user.pk = ids[user.username]
+                Student.objects.bulk_create([
+                    Student(
+                        user=user, student_id=row['student_id'], phone=row['phone'], address=row['address'],
+                        department=row['department'], year=row['year'],
+                    )
+                    for (_, row), user in zip(accepted, users)
+                ])
+                stats.increment({StatCounter.STUDENTS: len(accepted)})
+        except IntegrityError as e:
+            # Lost a race with a concurrent insert; nothing in this chunk was written.
+            for line_number, row in accepted:
+                self.reject(line_number, row, f"not written, chunk conflicted: {e}")
+            return
+
+        self.created += len(accepted)
+        if self.on_chunk:
+            self.on_chunk(self.processed, self.created)
+
+
+def enroll_file(path, fmt=None, report_path=None, **options):
+    """Enroll every row of a roster file, writing rejects to report_path as JSON Lines."""
+    fmt = fmt or ('jsonl' if str(path).endswith(('.jsonl', '.json')) else 'csv')
+    report_path = report_path or f"{path}.report.jsonl"
+    with open(path, newline='', encoding='utf-8') as handle, \
+            open(report_path, 'w', encoding='utf-8') as report:
+
+        def on_reject(line_number, row, reason):
+            report.write(json.dumps({'row': line_number, 'reason': reason, 'data': row}) + '\n')
+
+        enrollment = Enrollment(on_reject=on_reject, **options)
+        processed, created, rejected = enrollment.run(read_roster(handle, fmt))
+        report.write(json.dumps({'processed': processed, 'created': created, 'rejected': rejected}) + '\n')
+    return processed, created, rejected
+
+
+def enroll_upload(path, fmt=None, report_path=None, **options):
+    """enroll_file, then delete the roster, whose rows carry plaintext passwords."""
+    try:
+        return enroll_file(path, fmt, report_path, **options)
+    finally:
+        os.remove(path)
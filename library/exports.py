@@ -0,0 +1,89 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import IssuedBook, IssuedBookArchive
+
+COLUMNS = [
+    'id', 'isbn', 'title', 'student_id', 'issued_date',
+    'due_date', 'return_date', 'fine_amount', 'is_returned',
+]
+
+FIELDS = [
+    'id', 'book__isbn', 'book__title', 'student__student_id', 'issued_date',
+    'due_date', 'return_date', 'fine_amount', 'is_returned',
+]
+
+
+def filter_loans(status='all', date_from=None, date_to=None, search=''):
+    """Apply the issued_books filters; dates bound issued_date, inclusive.
+
+    Returned loans may have been archived, so unless only active loans are
+    wanted this is the union of IssuedBook and IssuedBookArchive.
+    """
+    loans = _filter(IssuedBook.objects.all(), status, date_from, date_to, search)
+    if status == 'active':
+        return loans
+    archived = _filter(IssuedBookArchive.objects.all(), status, date_from, date_to, search)
+    return loans.order_by().values_list(*FIELDS).union(archived.order_by().values_list(*FIELDS), all=True)
+
+
+def _filter(loans, status, date_from, date_to, search):
+    if status == 'active':
+        loans = loans.filter(is_returned=False)
+    elif status == 'returned':
+        loans = loans.filter(is_returned=True)
+    if date_from:
+        loans = loans.filter(issued_date__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        loans = loans.filter(
+            issued_date__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        )
+    if search:
+        loans = loans.filter(
+            Q(book__title__icontains=search) |
+            Q(student__student_id__icontains=search)
+        )
+    return loans
+
+
+def loan_rows(loans, chunk_size=2000):
+    """Yield plain tuples with the joins done in SQL, never building model instances."""
+    if not loans.query.combinator:
+        loans = loans.values_list(*FIELDS)
+    return loans.order_by('id').iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def _json_default(value):
+    # dates, datetimes and Decimal fines
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _cell(value):
+    return '' if value is None else _json_default(value)
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(COLUMNS, row)), default=_json_default) + '\n'
+
+
+WRITERS = {
+    'csv': (csv_lines, 'text/csv'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson'),
+}
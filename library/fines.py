@@ -0,0 +1,52 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, Value, When
+
+from . import summaries
+from .models import IssuedBook, Student
+
+
+def fine_for(due_date, today=None):
+    today = today or datetime.now().date()
+    days_overdue = (today - due_date).days
+    if days_overdue <= 0:
+        return Decimal('0')
+    return Decimal(days_overdue * IssuedBook.FINE_PER_DAY)
+
+
+def accrue_fines(today=None, batch_size=500):
+    """Recompute fine_amount for every overdue loan with set-based UPDATEs.
+
+    Overdue loans sharing a due date owe the same fine, so the loans are
+    grouped by due date and each batch of due dates is written with one
+    UPDATE ... CASE statement. Rows whose stored fine already matches are
+    excluded, so a rerun on the same day writes nothing. The summaries of
+    the students in each batch are refreshed in the same transaction.
+    """
+    today = today or datetime.now().date()
+    overdue = IssuedBook.objects.filter(is_returned=False, due_date__lt=today)
+    due_dates = list(
+        overdue.order_by().values_list('due_date', flat=True).distinct()
+    )
+
+    updated = 0
+    for start in range(0, len(due_dates), batch_size):
+        batch = due_dates[start:start + batch_size]
+        expected = Case(
+            *[When(due_date=d, then=Value(fine_for(d, today))) for d in batch],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        with transaction.atomic():
+            changed = (
+                overdue.filter(due_date__in=batch)
+                .exclude(fine_amount=expected)
+                .update(fine_amount=expected)
+            )
+            if changed:
+                summaries.refresh_where(
+                    Student.objects.filter(pk__in=overdue.filter(due_date__in=batch).values('student'))
+                )
+            updated += changed
+    return updated
@@ -0,0 +1,15 @@
+"""Process-pool workers for password hashing.
+
+Kept free of model imports: spawned workers import this module before
+Django is set up.
+"""
+import django
+
+
+def init_worker():
+    django.setup()
+
+
+def hash_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
@@ -0,0 +1,82 @@
+"""Resized WebP/JPEG derivatives of uploaded cover images and profile pictures.
+
+Variants live next to the original under a ``derived/`` folder, named
+``<stem>_<width>.<format>``, so their URLs can be computed from the
+original name without extra database columns. Kept free of model imports
+so backfill workers can import it before Django is set up.
+"""
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+WIDTHS = {
+    'book_covers': (320, 640),
+    'student_profiles': (150, 300),
+}
+DEFAULT_WIDTHS = (320, 640)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def widths_for(name):
+    return WIDTHS.get(posixpath.dirname(name).split('/')[0], DEFAULT_WIDTHS)
+
+
+def variant_name(name, width, fmt):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'derived', f'{stem}_{width}.{fmt}')
+
+
+def generate_variants(name, storage=None, overwrite=False):
+    """Write every width/format variant of the image stored at name.
+
+    Widths larger than the original are skipped rather than upscaled.
+    Returns the number of files written.
+    """
+    storage = storage or default_storage
+    try:
+        with storage.open(name, 'rb') as handle:
+            original = Image.open(handle)
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return 0
+
+    written = 0
+    for i, width in enumerate(widths_for(name)):
+        if i and width > original.width:
+            break
+        resized = original
+        if original.width > width:
+            height = round(original.height * width / original.width)
+            resized = original.resize((width, height), Image.LANCZOS)
+        for fmt, (pil_format, options) in FORMATS.items():
+            target = variant_name(name, width, fmt)
+            if not overwrite and storage.exists(target):
+                continue
+            image = resized.convert('RGBA' if fmt == 'webp' and resized.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **options)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
+
+
+def variant_url(field, width, fmt, storage=None):
+    """URL of the requested variant, or of the original until it has been generated."""
+    if not field:
+        return ''
+    storage = storage or default_storage
+    target = variant_name(field.name, width, fmt)
+    if storage.exists(target):
+        return storage.url(target)
+    return field.url
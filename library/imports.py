@@ -0,0 +1,211 @@
+import csv
+import json
+import re
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from . import stats
+from .models import Book, StatCounter
+
+CATEGORIES = {value for value, label in Book.CATEGORY_CHOICES}
+
+UPDATE_FIELDS = [
+    'title', 'author', 'category', 'publisher',
+    'publication_date', 'description', 'total_copies',
+]
+
+# MARC tag/subfield -> Book field, for the mnemonic (.mrk) text format.
+MARC_FIELDS = {
+    ('020', 'a'): 'isbn',
+    ('245', 'a'): 'title',
+    ('100', 'a'): 'author',
+    ('260', 'b'): 'publisher',
+    ('260', 'c'): 'publication_date',
+    ('264', 'b'): 'publisher',
+    ('264', 'c'): 'publication_date',
+    ('520', 'a'): 'description',
+    ('650', 'a'): 'category',
+    ('876', 'n'): 'total_copies',
+}
+
+
+class InvalidRecord(Exception):
+    pass
+
+
+def read_csv(handle):
+    yield from csv.DictReader(handle)
+
+
+def read_jsonl(handle):
+    for line in handle:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield InvalidRecord(f"invalid JSON: {e}")
+
+
+def read_marc(handle):
+    """Parse MarcEdit-style mnemonic records, one blank line between records:
+
+        =020  \\\\$a9780131103627
+        =245  10$aThe C programming language
+    """
+    record = {}
+    for line in handle:
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            if record:
+                yield record
+            record = {}
+            continue
+        if not line.startswith('=') or len(line) < 6:
+            continue
+        tag, data = line[1:4], line[6:]
+        for subfield in data.split('$')[1:]:
+            field = MARC_FIELDS.get((tag, subfield[:1]))
+            if field and field not in record:
+                record[field] = subfield[1:].strip(' /:;,.')
+    if record:
+        yield record
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+    'marc': read_marc,
+}
+
+
+def normalize_isbn(value):
+    isbn = re.sub(r'[\s-]', '', str(value or '')).upper()
+    if re.fullmatch(r'\d{9}[\dX]', isbn):
+        total = sum((10 - i) * (10 if c == 'X' else int(c)) for i, c in enumerate(isbn))
+        if total % 11 == 0:
+            return isbn
+    elif re.fullmatch(r'\d{13}', isbn):
+        total = sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(isbn))
+        if total % 10 == 0:
+            return isbn
+    raise InvalidRecord(f"invalid ISBN {value!r}")
+
+
+def parse_date(value):
+    value = str(value or '').strip()
+    match = re.search(r'\d{4}', value)
+    if not match:
+        raise InvalidRecord(f"invalid publication date {value!r}")
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return date(int(match.group()), 1, 1)
+
+
+def build_book(record):
+    if isinstance(record, InvalidRecord):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord("record is not an object")
+
+    isbn = normalize_isbn(record.get('isbn'))
+    category = str(record.get('category') or '').strip()
+    if category not in CATEGORIES:
+        raise InvalidRecord(f"unknown category {category!r}")
+    title = str(record.get('title') or '').strip()
+    author = str(record.get('author') or '').strip()
+    if not title or not author:
+        raise InvalidRecord("title and author are required")
+    try:
+        copies = int(record.get('total_copies') or 1)
+    except (TypeError, ValueError):
+        raise InvalidRecord(f"invalid total_copies {record.get('total_copies')!r}")
+    if copies < 1:
+        raise InvalidRecord(f"invalid total_copies {copies}")
+
+    return Book(
+        isbn=isbn,
+        title=title[:200],
+        author=author[:200],
+        category=category,
+        publisher=str(record.get('publisher') or '').strip()[:200],
+        publication_date=parse_date(record.get('publication_date')),
+        total_copies=copies,
+        available_copies=copies,
+        description=str(record.get('description') or '').strip(),
+    )
+
+
+def upsert_books(books):
+    """Insert or update a batch of books keyed on ISBN.
+
+    Existing titles get their catalog fields and total_copies refreshed.
+    Copies on loan stay on loan, so available_copies moves by the change
+    in total_copies rather than being reset, and never drops below 0.
+    Returns the number of newly created books.
+    """
+    by_isbn = {book.isbn: book for book in books}
+    with transaction.atomic():
+        existing = {
+            isbn: (total, available)
+            for isbn, total, available in Book.objects.select_for_update()
+            .filter(isbn__in=by_isbn).values_list('isbn', 'total_copies', 'available_copies')
+        }
+        Book.objects.bulk_create(
+            by_isbn.values(),
+            update_conflicts=True,
+            unique_fields=['isbn'],
+            update_fields=UPDATE_FIELDS,
+        )
+        created = [book for isbn, book in by_isbn.items() if isbn not in existing]
+        available = {
+            isbn: (old, max(0, old + by_isbn[isbn].total_copies - total))
+            for isbn, (total, old) in existing.items()
+        }
+        available = {isbn: counts for isbn, counts in available.items() if counts[0] != counts[1]}
+        if available:
+            Book.objects.filter(isbn__in=available).update(available_copies=Case(
+                *[When(isbn=isbn, then=Value(new)) for isbn, (old, new) in available.items()],
+            ))
+        stats.increment({
+            StatCounter.BOOKS: len(created),
+            StatCounter.AVAILABLE_COPIES: (
+                sum(book.available_copies for book in created)
+                + sum(new - old for old, new in available.values())
+            ),
+            # bulk_create sends no signals, so the cached catalog is invalidated here.
+            StatCounter.CATALOG_VERSION: 1,
+        })
+    return len(created)
+
+
+def import_books(records, batch_size=1000, on_reject=None, on_batch=None):
+    """Validate and upsert an iterable of book records in fixed-size batches.
+
+    on_reject(line_number, record, reason) is called for every invalid
+    record and on_batch(processed, created) after every committed batch.
+    Returns (processed, created, rejected).
+    """
+    processed = created = rejected = 0
+    batch = []
+    for line_number, record in enumerate(records, start=1):
+        processed += 1
+        try:
+            batch.append(build_book(record))
+        except InvalidRecord as e:
+            rejected += 1
+            if on_reject:
+                on_reject(line_number, record, str(e))
+        if len(batch) >= batch_size:
+            created += upsert_books(batch)
+            batch = []
+            if on_batch:
+                on_batch(processed, created)
+    if batch:
+        created += upsert_books(batch)
+        if on_batch:
+            on_batch(processed, created)
+    return processed, created, rejected
@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from library.fines import accrue_fines
+
+
+class Command(BaseCommand):
+    help = "Recompute fines for all overdue loans. Schedule this daily (e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="Accrue fines as of this date (YYYY-MM-DD).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Due dates per UPDATE statement.")
+
+    def handle(self, *args, **options):
+        updated = accrue_fines(today=options['date'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated fines on {updated} overdue loan(s)."))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.archive import archive_loans
+
+
+class Command(BaseCommand):
+    help = (
+        "Move loans returned more than LOAN_ARCHIVE_DAYS ago into the archive table in "
+        "short batches. Safe to run while the library is open; schedule it nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Archive loans returned more than this many days ago.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def on_batch(archived):
+            self.stderr.write(f"\r{archived} loans archived", ending='')
+
+        archived = archive_loans(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            on_batch=on_batch,
+        )
+        if archived:
+            self.stderr.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} returned loan(s) in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,139 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from library import circulation, stats
+from library.models import Book, DailyLoanRollup, IssuedBook, Student
+
+# Tries per attempt before a database error (e.g. SQLite's "database is
+# locked") fails the run.
+RETRIES = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer one hot title with parallel checkouts and returns and verify that "
+        "no copies are over-issued and no updates are lost. Creates a throwaway book "
+        "and students in the configured database and removes them, their report "
+        "rollups and their effect on the dashboard counters afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copies', type=int, default=50)
+        parser.add_argument('--attempts', type=int, default=300, help="Parallel checkout attempts.")
+        parser.add_argument('--workers', type=int, default=32)
+        parser.add_argument('--students', type=int, default=20)
+
+    def handle(self, *args, **options):
+        copies = options['copies']
+        tag = uuid.uuid4().hex[:8]
+        department = f"Benchmark {tag}"
+        book = Book.objects.create(
+            isbn=tag, title=f"Benchmark {tag}", author="Benchmark", category='Other',
+            publisher="Benchmark", publication_date=date.today(),
+            total_copies=copies, available_copies=copies,
+        )
+        students = [
+            Student.objects.create(
+                user=User.objects.create(username=f"bench-{tag}-{i}"),
+                student_id=f"B{tag}{i}", phone="0", address="-", department=department, year=1,
+            )
+            for i in range(options['students'])
+        ]
+        try:
+            self.run_checkouts(book, students, options)
+            self.run_returns(book, options)
+        finally:
+            User.objects.filter(username__startswith=f"bench-{tag}-").delete()
+            book.delete()
+            # The book's rollups went with it; the department's buckets are ours alone.
+            DailyLoanRollup.objects.filter(department=department).delete()
+            # Recount from the tables rather than undoing our deltas, which would
+            # be wrong if the run stopped halfway. The catalog version is left
+            # bumped: it must only move forward or stale cached pages come back.
+            stats.rebuild()
+
+    def run_checkouts(self, book, students, options):
+        def checkout(i):
+            try:
+                circulation.checkout(book, students[i % len(students)])
+                return 'issued'
+            except circulation.NoCopiesAvailable:
+                return 'rejected'
+
+        results, elapsed = self.run_parallel(checkout, range(options['attempts']), options['workers'])
+        issued = results.count('issued')
+        book.refresh_from_db()
+        loans = IssuedBook.objects.filter(book=book, is_returned=False).count()
+        self.report("checkout", results, elapsed)
+        self.check_errors("checkout", results)
+
+        expected = min(options['copies'], options['attempts'])
+        if issued != expected or loans != issued or book.available_copies != options['copies'] - issued:
+            raise CommandError(
+                f"Inconsistent checkout: issued={issued} loans={loans} "
+                f"available={book.available_copies} copies={options['copies']}"
+            )
+        self.stdout.write(self.style.SUCCESS("checkout: no over-issue, no lost updates"))
+
+    def run_returns(self, book, options):
+        # Every loan is returned twice concurrently; exactly one of each pair may win.
+        loans = list(IssuedBook.objects.filter(book=book, is_returned=False))
+
+        def return_book(loan):
+            try:
+                circulation.return_book(loan)
+                return 'returned'
+            except circulation.AlreadyReturned:
+                return 'rejected'
+
+        pairs = [loan for loan in loans for _ in range(2)]
+        results, elapsed = self.run_parallel(return_book, pairs, options['workers'])
+        book.refresh_from_db()
+        self.report("return", results, elapsed)
+        self.check_errors("return", results)
+
+        if results.count('returned') != len(loans) or book.available_copies != options['copies']:
+            raise CommandError(
+                f"Inconsistent return: returned={results.count('returned')} loans={len(loans)} "
+                f"available={book.available_copies} copies={options['copies']}"
+            )
+        self.stdout.write(self.style.SUCCESS("return: every loan closed exactly once"))
+
+    def run_parallel(self, fn, items, workers):
+        def attempt(item):
+            # A failed attempt rolled back, so it is safe to try again.
+            for tries in range(1, RETRIES + 1):
+                try:
+                    return fn(item)
+                except OperationalError:
+                    if tries == RETRIES:
+                        return 'error'
+                    time.sleep(0.01 * 2 ** tries)
+                finally:
+                    connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(attempt, items))
+        return results, time.perf_counter() - started
+
+    def check_errors(self, label, results):
+        # An attempt that never ran would hide a lost update; refuse to vouch for the run.
+        errors = results.count('error')
+        if errors:
+            raise CommandError(
+                f"{label}: {errors} attempt(s) still failed with database errors after {RETRIES} tries"
+            )
+
+    def report(self, label, results, elapsed):
+        self.stdout.write(
+            f"{label}: {len(results)} attempts in {elapsed:.2f}s "
+            f"({len(results) / elapsed:.0f}/s) - "
+            + ", ".join(f"{outcome}={results.count(outcome)}" for outcome in sorted(set(results)))
+        )
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+
+from library import stats
+from library.benchmarking import asgi_get, session_cookie, summarize, wsgi_get
+from library.models import Book, IssuedBook, Student
+from library.urls import urlpatterns
+
+# Routes that change data on GET; driving them in a loop would wreck the dataset.
+UNSAFE = {
+    'logout': "ends the session",
+    'delete_book': "deletes the book",
+    'delete_student': "deletes the student",
+    'return_book': "closes the loan",
+    'reserve_book': "creates a reservation",
+    'circulation_cart': "POST only; issues or returns books",
+}
+PUBLIC = {'index', 'admin_login', 'student_login', 'search_books'}
+STUDENT = {'student_dashboard'}
+QUERY = {
+    'autocomplete_books': 'q=hist',
+    'autocomplete_students': 'q=a',
+    'export_issued_books': 'status=active',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every route in library/urls.py with concurrent in-process clients and "
+        "print throughput and p50/p95/p99 latency per route as JSON. Routes that "
+        "modify data on GET are skipped. Run generate_library_data first for "
+        "production-sized numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route.")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--handler', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--route', action='append', help="Only these URL names (repeatable).")
+        parser.add_argument('--admin', help="Superuser to log in as (default: the first one).")
+        parser.add_argument('--student', help="Student username to log in as (default: the first active one).")
+        parser.add_argument('-o', '--output', help="Write the JSON report here instead of stdout.")
+
+    def handle(self, *args, **options):
+        cookies = self.cookies(options)
+        kwargs = self.sample_kwargs()
+        report = {
+            'commit': self.commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'handler': options['handler'],
+            'concurrency': options['concurrency'],
+            'requests_per_route': options['requests'],
+            'database': {'vendor': connection.vendor, **stats.read()},
+            'routes': {},
+            'skipped': {},
+        }
+
+        for pattern in urlpatterns:
+            name = pattern.name
+            if options['route'] and name not in options['route']:
+                continue
+            if name in UNSAFE:
+                report['skipped'][name] = UNSAFE[name]
+                continue
+            params = {key: kwargs[key] for key in pattern.pattern.converters}
+            path = reverse(name, kwargs=params)
+            if name in QUERY:
+                path = f'{path}?{QUERY[name]}'
+            role = 'public' if name in PUBLIC else 'student' if name in STUDENT else 'admin'
+            self.stderr.write(f"{name} ({path}, {role})...")
+            results, elapsed = self.drive(path, cookies[role], options)
+            report['routes'][name] = {'path': path, 'role': role, **summarize(results, elapsed)}
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def cookies(self, options):
+        admins = User.objects.filter(is_superuser=True)
+        if options['admin']:
+            admins = admins.filter(username=options['admin'])
+        students = Student.objects.filter(is_active=True).select_related('user')
+        if options['student']:
+            students = students.filter(user__username=options['student'])
+        admin = admins.order_by('pk').first()
+        student = students.order_by('pk').first()
+        if admin is None or student is None:
+            raise CommandError("Need a superuser and an active student; see createsuperuser and generate_library_data.")
+        return {'public': '', 'admin': session_cookie(admin), 'student': session_cookie(student.user)}
+
+    def sample_kwargs(self):
+        return {
+            'book_id': Book.objects.order_by('-pk').values_list('pk', flat=True).first() or 0,
+            'student_id': Student.objects.order_by('-pk').values_list('pk', flat=True).first() or 0,
+            'issue_id': IssuedBook.objects.order_by('-pk').values_list('pk', flat=True).first() or 0,
+        }
+
+    def drive(self, path, cookie, options):
+        count, concurrency = options['requests'], options['concurrency']
+        if options['handler'] == 'asgi':
+            return asyncio.run(self.drive_asgi(path, cookie, count, concurrency))
+        handler = WSGIHandler()
+        wsgi_get(handler, path, cookie)  # warm up
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda _: wsgi_get(handler, path, cookie), range(count)))
+        return results, time.perf_counter() - started
+
+    async def drive_asgi(self, path, cookie, count, concurrency):
+        handler = ASGIHandler()
+        await asgi_get(handler, path, cookie)  # warm up
+        remaining = iter(range(count))
+        results = []
+
+        async def client():
+            for _ in remaining:
+                results.append(await asgi_get(handler, path, cookie))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return results, time.perf_counter() - started
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
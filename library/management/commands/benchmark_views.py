@@ -0,0 +1,72 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from library.benchmarking import asgi_get, session_cookie, summarize, wsgi_get
+
+DEFAULT_PATHS = ['/', '/search_books/', '/search_books/?search=history']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/s and latency percentiles of the sync views under the WSGI "
+        "handler (thread per connection) with their async twins under the ASGI handler "
+        "(event loop) for the given paths, driven in-process at a fixed number of "
+        "concurrent connections. Pass --username to also exercise /student_dashboard/ "
+        "as that user."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help=f"Paths to request (default: {' '.join(DEFAULT_PATHS)}).")
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=5000, help="Requests per handler.")
+        parser.add_argument('--handler', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--username', help="Send a session cookie for this (student) user.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or list(DEFAULT_PATHS)
+        cookie = ''
+        if options['username']:
+            try:
+                cookie = session_cookie(User.objects.get(username=options['username']))
+            except User.DoesNotExist:
+                raise CommandError(f"No user {options['username']!r}")
+            paths.append('/student_dashboard/')
+        targets = [paths[i % len(paths)] for i in range(options['requests'])]
+
+        if options['handler'] in ('wsgi', 'both'):
+            self.report('wsgi', *self.run_wsgi(targets, cookie, options['concurrency']))
+        if options['handler'] in ('asgi', 'both'):
+            self.report('asgi', *asyncio.run(self.run_asgi(targets, cookie, options['concurrency'])))
+
+    def run_wsgi(self, targets, cookie, concurrency):
+        handler = WSGIHandler()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda target: wsgi_get(handler, target, cookie), targets))
+        return results, time.perf_counter() - started
+
+    async def run_asgi(self, targets, cookie, concurrency):
+        handler = ASGIHandler()
+        queue = iter(targets)
+        results = []
+
+        async def connection():
+            for target in queue:
+                results.append(await asgi_get(handler, target, cookie))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+        return results, time.perf_counter() - started
+
+    def report(self, label, results, elapsed):
+        summary = summarize(results, elapsed)
+        self.stdout.write(
+            f"{label}: {summary['requests']} requests in {summary['seconds']:.2f}s ({summary['rps']:.0f} req/s), "
+            f"p50 {summary['p50_ms']:.1f}ms, p99 {summary['p99_ms']:.1f}ms, errors={summary['errors']}"
+        )
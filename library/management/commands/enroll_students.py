@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.enrollment import enroll_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-enroll students from a CSV or JSON Lines roster (username, email, password, "
+        "first_name, last_name, student_id, phone, address, department, year). Password "
+        "hashing runs on a process pool; rejected and duplicate rows go to a report file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--workers', type=int, help="Hashing processes (default: CPU count).")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--report', help="Where to write rejected rows (default: <path>.report.jsonl).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def on_chunk(processed, created):
+            elapsed = time.perf_counter() - started
+            self.stderr.write(f"{processed} rows, {created} enrolled, {created / elapsed:.0f} students/s")
+
+        try:
+            processed, created, rejected = enroll_file(
+                options['path'],
+                fmt=options['format'],
+                report_path=options['report'],
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                on_chunk=on_chunk,
+            )
+        except FileNotFoundError as e:
+            raise CommandError(e)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Enrolled {created} of {processed} students ({rejected} rejected) in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from library.circulation import expire_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire reservations past their expiry date and pass lapsed holds to the next "
+        "student in line. Schedule this regularly (e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Lapsed holds released per transaction.")
+
+    def handle(self, *args, **options):
+        expired, released, filled = expire_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {expired} waiting reservation(s), released {released} lapsed hold(s), "
+            f"placed {filled} new hold(s) from shelved copies."
+        ))
@@ -0,0 +1,30 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from library.exports import WRITERS, filter_loans, loan_rows
+
+
+class Command(BaseCommand):
+    help = "Stream the circulation history (joined with book title, ISBN and student ID) as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help="File to write (default: stdout).")
+        parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+        parser.add_argument('--status', choices=['active', 'returned', 'all'], default='all')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help="Issued on or after (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help="Issued on or before (YYYY-MM-DD).")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        loans = filter_loans(options['status'], options['date_from'], options['date_to'])
+        lines, _ = WRITERS[options['format']]
+        rows = loan_rows(loans, chunk_size=options['chunk_size'])
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for line in lines(rows):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
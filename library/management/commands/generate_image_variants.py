@@ -0,0 +1,44 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library.images import WIDTHS, generate_variants
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+
+def _generate(name, overwrite):
+    return generate_variants(name, overwrite=overwrite)
+
+
+class Command(BaseCommand):
+    help = "Backfill resized WebP/JPEG variants for every cover image and profile picture under MEDIA_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count).")
+        parser.add_argument('--overwrite', action='store_true', help="Regenerate variants that already exist.")
+
+    def handle(self, *args, **options):
+        names = list(self.originals())
+        started = time.perf_counter()
+        written = 0
+        with ProcessPoolExecutor(options['workers'] or os.cpu_count()) as pool:
+            for count in pool.map(_generate, names, [options['overwrite']] * len(names), chunksize=16):
+                written += count
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(names)} images, wrote {written} variants in {elapsed:.1f}s."
+        ))
+
+    def originals(self):
+        for folder in WIDTHS:
+            root = os.path.join(settings.MEDIA_ROOT, folder)
+            for directory, subdirs, files in os.walk(root):
+                subdirs[:] = [subdir for subdir in subdirs if subdir != 'derived']
+                for filename in files:
+                    if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                        path = os.path.join(directory, filename)
+                        yield os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
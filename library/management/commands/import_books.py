@@ -0,0 +1,59 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.imports import READERS, import_books
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream books from a CSV, JSON Lines or MARC mnemonic (.mrk) file and upsert "
+        "them on ISBN. Invalid rows are written to a rejects file instead of aborting."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS), help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--rejects', help="Where to write rejected rows (default: <path>.rejects.jsonl).")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"{path} does not exist")
+        fmt = options['format'] or {'.mrk': 'marc', '.json': 'jsonl', '.jsonl': 'jsonl'}.get(path.suffix, 'csv')
+        rejects_path = Path(options['rejects'] or f"{path}.rejects.jsonl")
+        started = time.perf_counter()
+
+        def on_batch(processed, created):
+            elapsed = time.perf_counter() - started
+            self.stderr.write(f"\r{processed} rows, {created} new, {processed / elapsed:.0f} rows/s", ending='')
+
+        with open(path, newline='', encoding='utf-8') as handle, \
+                open(rejects_path, 'w', encoding='utf-8') as rejects:
+
+            def on_reject(line_number, record, reason):
+                if not isinstance(record, dict):
+                    record = None
+                rejects.write(json.dumps({'record': line_number, 'reason': reason, 'data': record}) + '\n')
+
+            processed, created, rejected = import_books(
+                READERS[fmt](handle),
+                batch_size=options['batch_size'],
+                on_reject=on_reject,
+                on_batch=on_batch,
+            )
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {processed - rejected} of {processed} records "
+            f"({created} new, {rejected} rejected) in {elapsed:.1f}s "
+            f"({processed / max(elapsed, 1e-9):.0f} rows/s)."
+        ))
+        if rejected:
+            self.stdout.write(f"Rejected rows written to {rejects_path}")
+        else:
+            rejects_path.unlink()
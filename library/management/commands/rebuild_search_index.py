@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text catalog search index from the book table."
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
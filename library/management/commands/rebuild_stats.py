@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library import reports, stats, summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard counters, student summaries and report rollups from scratch to correct any drift."
+
+    def handle(self, *args, **options):
+        for name, value in stats.rebuild().items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(f"student summaries: {summaries.rebuild()}")
+        self.stdout.write("report rollups: {} loan bucket(s), {} book bucket(s)".format(*reports.rebuild()))
+        self.stdout.write(self.style.SUCCESS("Dashboard counters rebuilt."))
@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def sqlite_path(name):
+    name = str(name)
+    return urlsplit(name).path if name.startswith('file:') else name
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over every replica in DATABASE_REPLICAS. "
+        "Each copy is written beside the replica and swapped in atomically, so readers "
+        "never see a half-written file. With --interval, keep copying to stand in for "
+        "replication when testing locally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help="Seconds between copies; copy once if omitted.")
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas:
+            raise CommandError("No replicas configured; set LIBRARY_REPLICAS.")
+        for alias in ['default', *replicas]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"{alias} is not SQLite; use the database's own replication.")
+        primary = sqlite_path(settings.DATABASES['default']['NAME'])
+        while True:
+            started = time.perf_counter()
+            with sqlite3.connect(primary) as source:
+                for alias in replicas:
+                    path = sqlite_path(settings.DATABASES[alias]['NAME'])
+                    with sqlite3.connect(f'{path}.tmp') as target:
+                        source.backup(target)
+                    target.close()
+                    os.replace(f'{path}.tmp', path)
+            source.close()
+            self.stdout.write(
+                f"Copied {primary} to {len(replicas)} replica(s) in {time.perf_counter() - started:.2f}s"
+            )
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,177 @@
+"""Per-view request latency and SQL histograms and application counters,
+exported in Prometheus text format.
+
+Each process accumulates observations in memory and, when
+settings.METRICS_DIR is set, periodically writes a snapshot to its own
+JSON file there. The /metrics view merges every snapshot in that
+directory, so a scrape sees the totals of all WSGI/ASGI worker processes
+sharing it. Snapshots of exited processes are kept so the counters stay
+monotonic; clear the directory when deploying if that is not wanted.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+
+HISTOGRAMS = {
+    'library_request_duration_seconds': (
+        "Request latency by view.",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    'library_db_queries': (
+        "SQL queries per request by view.",
+        (0, 1, 2, 5, 10, 20, 50, 100),
+    ),
+    'library_db_duration_seconds': (
+        "SQL time per request by view.",
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+    ),
+}
+
+COUNTERS = {
+    'library_catalog_cache_hits_total': "Catalog grid fragments served from the cache.",
+    'library_catalog_cache_misses_total': "Catalog grid fragments rendered from the database.",
+}
+
+_lock = threading.Lock()
+# metric -> view -> [count per bucket..., count above the last bucket, sum]
+_series = {name: {} for name in HISTOGRAMS}
+_counters = {name: 0 for name in COUNTERS}
+_snapshot_name = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+_last_flush = time.monotonic()
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def observe(view, duration, queries, db_duration):
+    """Record one request; flushes to disk at most every METRICS_FLUSH_INTERVAL seconds."""
+    with _lock:
+        for name, value in (
+            ('library_request_duration_seconds', duration),
+            ('library_db_queries', queries),
+            ('library_db_duration_seconds', db_duration),
+        ):
+            buckets = HISTOGRAMS[name][1]
+            series = _series[name].get(view)
+            if series is None:
+                series = _series[name][view] = [0] * (len(buckets) + 1) + [0.0]
+            series[bisect_left(buckets, value)] += 1
+            series[-1] += value
+        due = _flush_due()
+    if due:
+        flush()
+
+
+def inc(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+        due = _flush_due()
+    if due:
+        flush()
+
+
+def counter_values():
+    """This process's counters, without the other workers' snapshots."""
+    with _lock:
+        return dict(_counters)
+
+
+def _flush_due():
+    global _last_flush
+    now = time.monotonic()
+    if now - _last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+        _last_flush = now
+        return True
+    return False
+
+
+def flush():
+    """Write this process's snapshot atomically into METRICS_DIR."""
+    directory = metrics_dir()
+    if not directory:
+        return
+    with _lock:
+        if not any(_series.values()) and not any(_counters.values()):
+            return
+        data = json.dumps({'histograms': _series, 'counters': _counters})
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, _snapshot_name)
+    temp = f'{path}.{threading.get_ident()}.tmp'
+    with open(temp, 'w') as handle:
+        handle.write(data)
+    os.replace(temp, path)
+
+
+atexit.register(flush)
+
+
+def collect():
+    """Merge the snapshots of every process.
+
+    Returns ({histogram: {view: series}}, {counter: value}).
+    """
+    flush()
+    directory = metrics_dir()
+    if directory and os.path.isdir(directory):
+        snapshots = []
+        for filename in os.listdir(directory):
+            if filename.endswith('.json'):
+                try:
+                    with open(os.path.join(directory, filename)) as handle:
+                        snapshots.append(json.load(handle))
+                except (OSError, ValueError):
+                    continue
+    else:
+        with _lock:
+            snapshots = [json.loads(json.dumps({'histograms': _series, 'counters': _counters}))]
+
+    histograms = {name: {} for name in HISTOGRAMS}
+    counters = {name: 0 for name in COUNTERS}
+    for snapshot in snapshots:
+        for name, views in snapshot.get('histograms', {}).items():
+            if name not in histograms:
+                continue
+            for view, series in views.items():
+                total = histograms[name].setdefault(view, [0] * len(series))
+                for i, value in enumerate(series):
+                    total[i] += value
+        for name, value in snapshot.get('counters', {}).items():
+            if name in counters:
+                counters[name] += value
+    return histograms, counters
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    lines = []
+    histograms, counters = collect()
+    for name, value in counters.items():
+        lines.append(f'# HELP {name} {COUNTERS[name]}')
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {value}')
+    for name, views in histograms.items():
+        help_text, buckets = HISTOGRAMS[name]
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for view in sorted(views):
+            series = views[view]
+            label = f'view="{_label(view)}"'
+            cumulative = 0
+            for bound, count in zip(buckets, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            count = sum(series[:-1])
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{label}}} {series[-1]}')
+            lines.append(f'{name}_count{{{label}}} {count}')
+    return '\n'.join(lines) + '\n'
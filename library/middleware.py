@@ -0,0 +1,266 @@
+import contextvars
+from functools import partial
+import logging
+import random
+import re
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.functional import SimpleLazyObject
+
+from . import accounts, metrics, routers
+
+logger = logging.getLogger(__name__)
+
+# Collapse "IN (%s, %s, ...)" so the same query with a different list size
+# counts as one shape.
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+
+# Collectors for the current request. A context variable rather than a
+# per-request execute_wrapper because async views run their queries on
+# another thread with its own connection; the context follows them there.
+_collectors = contextvars.ContextVar('library_query_collectors', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    collectors = _collectors.get()
+    if not collectors:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for collector in collectors:
+            collector.record(sql, elapsed)
+
+
+def install_wrapper(connection, **kwargs):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+connection_created.connect(install_wrapper)
+
+
+class SQLTimer:
+    """Counts and times the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def record(self, sql, elapsed):
+        self.count += 1
+        self.duration += elapsed
+
+
+class QueryCounter(SQLTimer):
+    """SQLTimer that also tallies query shapes to spot N+1 patterns."""
+
+    def __init__(self):
+        super().__init__()
+        self.shapes = Counter()
+
+    def record(self, sql, elapsed):
+        super().record(sql, elapsed)
+        self.shapes[PLACEHOLDER_LIST.sub('%s', sql)] += 1
+
+    def repeated(self, threshold):
+        return [(sql, n) for sql, n in self.shapes.most_common() if n >= threshold]
+
+
+class QueryCollectorMiddleware:
+    """Run the rest of the chain with a fresh collector and report on it.
+
+    Works under both WSGI and ASGI; in the async case the timing covers the
+    awaited view, not the streaming of the response body.
+    """
+
+    sync_capable = True
+    async_capable = True
+    collector_class = SQLTimer
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_wrapper(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        collector = self.collector_class()
+        token = _collectors.set(_collectors.get() + (collector,))
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _collectors.reset(token)
+        self.report(request, response, collector, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        collector = self.collector_class()
+        token = _collectors.set(_collectors.get() + (collector,))
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _collectors.reset(token)
+        self.report(request, response, collector, time.perf_counter() - started)
+        return response
+
+    def report(self, request, response, collector, duration):
+        """Called after every request; subclasses log or record the collector."""
+
+
+class QueryCountMiddleware(QueryCollectorMiddleware):
+    """Count and time the SQL each request runs and log the ones that overspend.
+
+    A request is reported when it runs more than QUERY_COUNT_BUDGET queries
+    or runs the same query shape QUERY_COUNT_REPEAT_THRESHOLD times or more,
+    which is almost always a related object being loaded once per row.
+    Queries run while a streaming response is consumed are not counted.
+    """
+
+    collector_class = QueryCounter
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.budget = getattr(settings, 'QUERY_COUNT_BUDGET', 20)
+        self.repeat_threshold = getattr(settings, 'QUERY_COUNT_REPEAT_THRESHOLD', 5)
+
+    def report(self, request, response, counter, duration):
+        repeated = counter.repeated(self.repeat_threshold)
+        if counter.count > self.budget or repeated:
+            match = request.resolver_match
+            logger.warning(
+                "%s %s (%s) ran %d queries in %.1fms (budget %d)%s",
+                request.method, request.path, match.view_name if match else 'unresolved',
+                counter.count, counter.duration * 1000, self.budget,
+                ''.join(f"\n  likely N+1, {n}x: {sql}" for sql, n in repeated),
+            )
+        if settings.DEBUG:
+            response['Server-Timing'] = f'db;dur={counter.duration * 1000:.1f};desc="{counter.count} queries"'
+
+
+class MetricsMiddleware(QueryCollectorMiddleware):
+    """Feed request latency and SQL count/time per URL name into library.metrics."""
+
+    def report(self, request, response, timer, duration):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.observe(view, duration, timer.count, timer.duration)
+
+
+class ASGIURLConfMiddleware:
+    """Resolve requests served by the ASGI handler against settings.ASGI_URLCONF.
+
+    That URLconf routes to the async implementations of views that have
+    one, while WSGI requests keep ROOT_URLCONF and the sync views, so
+    neither handler runs a view through a sync/async adapter.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.urlconf = settings.ASGI_URLCONF
+        return await self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """Serve a request's catalog and reporting reads from a read replica.
+
+    Each safe request picks one alias from DATABASE_REPLICAS. Unsafe
+    methods read from the primary, and once a request writes, its session
+    is pinned to the primary for REPLICA_PIN_SECONDS so the user sees their
+    own change before the replicas catch up. Must come after
+    SessionMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+    session_key = '_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.replicas = list(getattr(settings, 'DATABASE_REPLICAS', []))
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+    def choose(self, request, pinned_until):
+        if not self.replicas or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        if pinned_until and pinned_until > time.time():
+            return None
+        return random.choice(self.replicas)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.replicas:
+            return self.get_response(request)
+        token = routers.begin(self.choose(request, request.session.get(self.session_key)))
+        try:
+            response = self.get_response(request)
+        finally:
+            routing = routers.end(token)
+        if routing.wrote:
+            request.session[self.session_key] = time.time() + self.pin_seconds
+        return response
+
+    async def __acall__(self, request):
+        if not self.replicas:
+            return await self.get_response(request)
+        token = routers.begin(self.choose(request, await request.session.aget(self.session_key)))
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing = routers.end(token)
+        if routing.wrote:
+            await request.session.aset(self.session_key, time.time() + self.pin_seconds)
+        return response
+
+
+async def _astudent(request):
+    return await accounts.aget_student(await request.auser())
+
+
+class StudentMiddleware:
+    """Attach the cached Student profile of the logged-in user.
+
+    request.student is loaded on first use and is falsy for anonymous
+    users and users without a profile; async views await
+    request.astudent() instead. Must come after AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.student = SimpleLazyObject(lambda: accounts.get_student(request.user))
+        request.astudent = partial(_astudent, request)
+        return self.get_response(request)
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE library_book_fts USING fts5(
+        isbn, title, author, publisher, description,
+        content='library_book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER library_book_fts_ai AFTER INSERT ON library_book BEGIN
+        INSERT INTO library_book_fts(rowid, isbn, title, author, publisher, description)
+        VALUES (new.id, new.isbn, new.title, new.author, new.publisher, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER library_book_fts_ad AFTER DELETE ON library_book BEGIN
+        INSERT INTO library_book_fts(library_book_fts, rowid, isbn, title, author, publisher, description)
+        VALUES ('delete', old.id, old.isbn, old.title, old.author, old.publisher, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER library_book_fts_au AFTER UPDATE ON library_book
+    WHEN old.isbn IS NOT new.isbn OR old.title IS NOT new.title OR old.author IS NOT new.author
+        OR old.publisher IS NOT new.publisher OR old.description IS NOT new.description
+    BEGIN
+        INSERT INTO library_book_fts(library_book_fts, rowid, isbn, title, author, publisher, description)
+        VALUES ('delete', old.id, old.isbn, old.title, old.author, old.publisher, old.description);
+        INSERT INTO library_book_fts(rowid, isbn, title, author, publisher, description)
+        VALUES (new.id, new.isbn, new.title, new.author, new.publisher, new.description);
+    END
+    """,
+    "INSERT INTO library_book_fts(library_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS library_book_fts_au",
+    "DROP TRIGGER IF EXISTS library_book_fts_ad",
+    "DROP TRIGGER IF EXISTS library_book_fts_ai",
+    "DROP TABLE IF EXISTS library_book_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    """
+    CREATE INDEX library_book_search_idx ON library_book USING GIN ((
+        to_tsvector('english', isbn || ' ' || title || ' ' || author || ' ' || publisher || ' ' || description)
+    ))
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS library_book_search_idx",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRESQL_REVERSE}),
+        ),
+    ]
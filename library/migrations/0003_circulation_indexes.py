@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_book_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['added_date'], name='book_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['category', 'added_date'], name='book_category_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_copies__gt', 0)), fields=['added_date'], name='book_available_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookreservation',
+            index=models.Index(fields=['book', 'student', 'is_active'], name='reservation_book_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookreservation',
+            index=models.Index(fields=['student', 'is_active'], name='reservation_student_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuedbook',
+            index=models.Index(fields=['is_returned', 'due_date'], name='issuedbook_returned_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuedbook',
+            index=models.Index(fields=['issued_date'], name='issuedbook_issued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuedbook',
+            index=models.Index(fields=['is_returned', 'issued_date'], name='issuedbook_returned_issued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuedbook',
+            index=models.Index(fields=['student', 'is_returned'], name='issuedbook_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuedbook',
+            index=models.Index(condition=models.Q(('is_returned', False)), fields=['due_date'], name='issuedbook_active_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['department', 'student_id'], name='student_department_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['student_id'], name='student_active_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:04
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_counters(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    Student = apps.get_model('library', 'Student')
+    IssuedBook = apps.get_model('library', 'IssuedBook')
+    StatCounter = apps.get_model('library', 'StatCounter')
+    StatCounter.objects.bulk_create([
+        StatCounter(name='books', value=Book.objects.count()),
+        StatCounter(name='students', value=Student.objects.count()),
+        StatCounter(name='active_loans', value=IssuedBook.objects.filter(is_returned=False).count()),
+        StatCounter(
+            name='available_copies',
+            value=Book.objects.aggregate(total=Sum('available_copies'))['total'] or 0,
+        ),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_circulation_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# istartswith compiles to LIKE on SQLite, which can only use an index built
+# with NOCASE collation, and to UPPER(col) LIKE UPPER(%s) on PostgreSQL.
+INDEXES = [
+    ('library_student_student_id_nocase', 'library_student', 'student_id'),
+    ('auth_user_first_name_nocase', 'auth_user', 'first_name'),
+    ('auth_user_last_name_nocase', 'auth_user', 'last_name'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name, table, column in INDEXES:
+        if vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} ({column} COLLATE NOCASE)')
+        elif vendor == 'postgresql':
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} ((UPPER({column}::text)) text_pattern_ops)')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        for name, table, column in INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_statcounter'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:10
+
+import django.db.models.deletion
+import library.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchIndex',
+            fields=[
+                ('book', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='library.book')),
+                ('document', library.search.SearchDocumentField(db_column='library_book_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'library_book_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:19
+
+from django.db import migrations, models
+
+
+def expire_inactive(apps, schema_editor):
+    # Existing active reservations never had a copy set aside, so they
+    # join the waitlist; inactive ones are history.
+    BookReservation = apps.get_model('library', 'BookReservation')
+    BookReservation.objects.filter(is_active=False).update(status='expired')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_booksearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookreservation',
+            name='status',
+            field=models.CharField(choices=[('waiting', 'Waiting'), ('held', 'Ready for pickup'), ('fulfilled', 'Fulfilled'), ('expired', 'Expired'), ('cancelled', 'Cancelled')], default='waiting', max_length=10),
+        ),
+        migrations.RunPython(expire_inactive, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='bookreservation',
+            index=models.Index(fields=['book', 'status', 'reservation_date'], name='reservation_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookreservation',
+            index=models.Index(fields=['status', 'expiry_date'], name='reservation_status_expiry_idx'),
+        ),
+    ]
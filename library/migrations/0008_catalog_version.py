@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_catalog_version(apps, schema_editor):
+    StatCounter = apps.get_model('library', 'StatCounter')
+    StatCounter.objects.get_or_create(name='catalog_version', defaults={'value': 0})
+
+
+def delete_catalog_version(apps, schema_editor):
+    StatCounter = apps.get_model('library', 'StatCounter')
+    StatCounter.objects.filter(name='catalog_version').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_reservation_waitlist'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_catalog_version, delete_catalog_version),
+    ]
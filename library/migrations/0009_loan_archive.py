@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_catalog_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IssuedBookArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('issued_date', models.DateTimeField()),
+                ('due_date', models.DateField()),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('fine_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('is_returned', models.BooleanField(default=True)),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-issued_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='issuedbook',
+            index=models.Index(condition=models.Q(('is_returned', True)), fields=['return_date'], name='issuedbook_returned_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='issuedbookarchive',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='library.book'),
+        ),
+        migrations.AddField(
+            model_name='issuedbookarchive',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='library.student'),
+        ),
+        migrations.AddIndex(
+            model_name='issuedbookarchive',
+            index=models.Index(fields=['issued_date'], name='archive_issued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuedbookarchive',
+            index=models.Index(fields=['student', 'issued_date'], name='archive_student_issued_idx'),
+        ),
+    ]
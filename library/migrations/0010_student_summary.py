@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def populate_summaries(apps, schema_editor):
+    Student = apps.get_model('library', 'Student')
+    StudentSummary = apps.get_model('library', 'StudentSummary')
+    IssuedBook = apps.get_model('library', 'IssuedBook')
+    BookReservation = apps.get_model('library', 'BookReservation')
+
+    summaries = {}
+    loans = (
+        IssuedBook.objects.filter(is_returned=False).order_by().values('student')
+        .annotate(n=Count('id'), due=Min('due_date'), fines=Sum('fine_amount'))
+    )
+    for row in loans:
+        summaries[row['student']] = StudentSummary(
+            student_id=row['student'], active_loans=row['n'],
+            next_due_date=row['due'], outstanding_fines=row['fines'] or 0,
+        )
+    reservations = (
+        BookReservation.objects.filter(is_active=True).order_by().values('student').annotate(n=Count('id'))
+    )
+    for row in reservations:
+        summary = summaries.setdefault(row['student'], StudentSummary(student_id=row['student']))
+        summary.active_reservations = row['n']
+    # Students with nothing outstanding need no row.
+    StudentSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_loan_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='library.student')),
+                ('active_loans', models.IntegerField(default=0)),
+                ('next_due_date', models.DateField(blank=True, null=True)),
+                ('outstanding_fines', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('active_reservations', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:45
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    DailyLoanRollup = apps.get_model('library', 'DailyLoanRollup')
+    DailyBookRollup = apps.get_model('library', 'DailyBookRollup')
+
+    loans = defaultdict(Counter)
+    books = Counter()
+    for name in ('IssuedBook', 'IssuedBookArchive'):
+        model = apps.get_model('library', name)
+        issues = model.objects.order_by().annotate(day=TruncDate('issued_date'))
+        for day, category, department, n in (
+            issues.values_list('day', 'book__category', 'student__department').annotate(n=Count('id'))
+        ):
+            loans[day, category, department]['issued'] += n
+        for day, book_id, n in issues.values_list('day', 'book_id').annotate(n=Count('id')):
+            books[day, book_id] += n
+        returns = (
+            model.objects.filter(is_returned=True).order_by()
+            .values_list('return_date', 'book__category', 'student__department')
+            .annotate(
+                n=Count('id'),
+                late=Count('id', filter=Q(return_date__gt=F('due_date'))),
+                fines=Sum('fine_amount'),
+            )
+        )
+        for day, category, department, n, late, fines in returns:
+            bucket = loans[day, category, department]
+            bucket['returned'] += n
+            bucket['returned_late'] += late
+            bucket['fines'] += fines or 0
+
+    DailyLoanRollup.objects.bulk_create(
+        (
+            DailyLoanRollup(day=day, category=category, department=department, **fields)
+            for (day, category, department), fields in loans.items()
+        ),
+        batch_size=1000,
+    )
+    DailyBookRollup.objects.bulk_create(
+        (DailyBookRollup(day=day, book_id=book_id, issued=n) for (day, book_id), n in books.items()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_book_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLoanRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(max_length=50)),
+                ('department', models.CharField(max_length=100)),
+                ('issued', models.IntegerField(default=0)),
+                ('returned', models.IntegerField(default=0)),
+                ('returned_late', models.IntegerField(default=0)),
+                ('fines', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'category', 'department'), name='loanrollup_bucket_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyBookRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('issued', models.IntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'book'), name='bookrollup_bucket_unique')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
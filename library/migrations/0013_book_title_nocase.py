@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# Book autocomplete matches a title prefix with istartswith and walks the
+# index in title order, so LIMIT stops at the first matches; see 0005 for
+# why SQLite needs NOCASE and PostgreSQL UPPER text_pattern_ops.
+INDEX = 'library_book_title_nocase'
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'CREATE INDEX {INDEX} ON library_book (title COLLATE NOCASE)')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX {INDEX} ON library_book ((UPPER(title::text)) text_pattern_ops)')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_loan_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
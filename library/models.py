@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from datetime import datetime, timedelta
+from .search import FTS_TABLE, SearchDocumentField
 
 class Book(models.Model):
     CATEGORY_CHOICES = [
@@ -33,6 +34,31 @@ class Book(models.Model):
     
     class Meta:
         ordering = ['-added_date']
+        indexes = [
+            models.Index(fields=['added_date'], name='book_added_idx'),
+            models.Index(fields=['category', 'added_date'], name='book_category_added_idx'),
+            models.Index(
+                fields=['added_date'], name='book_available_added_idx',
+                condition=models.Q(available_copies__gt=0),
+            ),
+        ]
+
+class BookSearchIndex(models.Model):
+    """The SQLite FTS5 table from migration 0002, joined by search.search_books.
+
+    Unmanaged: the table and the triggers that fill it are created by
+    0002, and on other backends it does not exist and is never queried.
+    """
+    book = models.OneToOneField(
+        Book, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', related_name='search_index',
+    )
+    document = SearchDocumentField(db_column=FTS_TABLE)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
 
 class Student(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -50,8 +76,17 @@ class Student(models.Model):
     
     class Meta:
         ordering = ['student_id']
+        indexes = [
+            models.Index(fields=['department', 'student_id'], name='student_department_idx'),
+            models.Index(
+                fields=['student_id'], name='student_active_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
 class IssuedBook(models.Model):
+    FINE_PER_DAY = 5
+
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     issued_date = models.DateTimeField(auto_now_add=True)
@@ -66,22 +101,170 @@ class IssuedBook(models.Model):
     def calculate_fine(self):
         if not self.is_returned and datetime.now().date() > self.due_date:
             days_overdue = (datetime.now().date() - self.due_date).days
-            self.fine_amount = days_overdue * 5
+            self.fine_amount = days_overdue * self.FINE_PER_DAY
             self.save()
         return self.fine_amount
     
     class Meta:
         ordering = ['-issued_date']
+        indexes = [
+            models.Index(fields=['is_returned', 'due_date'], name='issuedbook_returned_due_idx'),
+            models.Index(fields=['issued_date'], name='issuedbook_issued_idx'),
+            models.Index(fields=['is_returned', 'issued_date'], name='issuedbook_returned_issued_idx'),
+            models.Index(fields=['student', 'is_returned'], name='issuedbook_student_status_idx'),
+            models.Index(
+                fields=['due_date'], name='issuedbook_active_due_idx',
+                condition=models.Q(is_returned=False),
+            ),
+            models.Index(
+                fields=['return_date'], name='issuedbook_returned_date_idx',
+                condition=models.Q(is_returned=True),
+            ),
+        ]
+
+class IssuedBookArchive(models.Model):
+    """Returned loans moved out of IssuedBook by library.archive, keeping their ids."""
+    id = models.BigIntegerField(primary_key=True)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    issued_date = models.DateTimeField()
+    due_date = models.DateField()
+    return_date = models.DateField(null=True, blank=True)
+    fine_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    is_returned = models.BooleanField(default=True)
+    archived_date = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.book.title} - {self.student.student_id}"
+    
+    class Meta:
+        ordering = ['-issued_date']
+        indexes = [
+            models.Index(fields=['issued_date'], name='archive_issued_idx'),
+            models.Index(fields=['student', 'issued_date'], name='archive_student_issued_idx'),
+        ]
 
 class BookReservation(models.Model):
+    # A waiting reservation queues for the next free copy until expiry_date;
+    # a held one has a copy set aside (not in available_copies) until then.
+    WAITING = 'waiting'
+    HELD = 'held'
+    FULFILLED = 'fulfilled'
+    EXPIRED = 'expired'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (WAITING, 'Waiting'),
+        (HELD, 'Ready for pickup'),
+        (FULFILLED, 'Fulfilled'),
+        (EXPIRED, 'Expired'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    HOLD_DAYS = 3
+    WAITLIST_DAYS = 30
+
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     reservation_date = models.DateTimeField(auto_now_add=True)
     expiry_date = models.DateTimeField()
     is_active = models.BooleanField(default=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
     
     def __str__(self):
         return f"{self.book.title} reserved by {self.student.student_id}"
     
     class Meta:
         ordering = ['-reservation_date']
+        indexes = [
+            models.Index(fields=['book', 'student', 'is_active'], name='reservation_book_student_idx'),
+            models.Index(fields=['student', 'is_active'], name='reservation_student_active_idx'),
+            models.Index(fields=['book', 'status', 'reservation_date'], name='reservation_queue_idx'),
+            models.Index(fields=['status', 'expiry_date'], name='reservation_status_expiry_idx'),
+        ]
+
+class StudentSummary(models.Model):
+    """Per-student dashboard figures, kept current by library.summaries."""
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    active_loans = models.IntegerField(default=0)
+    next_due_date = models.DateField(null=True, blank=True)
+    outstanding_fines = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    active_reservations = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.student.student_id}: {self.active_loans} loan(s), {self.active_reservations} reservation(s)"
+
+class BookPair(models.Model):
+    """One cell of the symmetric book co-borrowing matrix, stored with book_a <= book_b.
+
+    count is how many students borrowed both books; on the diagonal
+    (book_a == book_b) it is how many students borrowed the book.
+    """
+    book_a = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', db_index=False)
+    book_b = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book_a', 'book_b'], name='bookpair_unique'),
+        ]
+
+class BookRecommendation(models.Model):
+    """Precomputed "borrowed together" neighbours of a book, best first."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.SmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='recommendation_rank_unique'),
+        ]
+
+class DailyLoanRollup(models.Model):
+    """Loans issued and returned on one day, per book category and student department.
+
+    Maintained by library.reports; reports sum these buckets instead of
+    grouping the loan tables.
+    """
+    day = models.DateField()
+    category = models.CharField(max_length=50)
+    department = models.CharField(max_length=100)
+    issued = models.IntegerField(default=0)
+    returned = models.IntegerField(default=0)
+    returned_late = models.IntegerField(default=0)
+    fines = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.day} {self.category}/{self.department}: {self.issued} issued, {self.returned} returned"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category', 'department'], name='loanrollup_bucket_unique'),
+        ]
+
+class DailyBookRollup(models.Model):
+    """How many times a book was issued on one day, for the most-borrowed report."""
+    day = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    issued = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'book'], name='bookrollup_bucket_unique'),
+        ]
+
+class StatCounter(models.Model):
+    BOOKS = 'books'
+    STUDENTS = 'students'
+    ACTIVE_LOANS = 'active_loans'
+    AVAILABLE_COPIES = 'available_copies'
+    # Not a count: bumped on every change to what the public catalog shows.
+    CATALOG_VERSION = 'catalog_version'
+    # Not a count: the last loan id folded into the BookPair matrix.
+    RECOMMENDATIONS_WATERMARK = 'recommendations_watermark'
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
@@ -0,0 +1,224 @@
+import base64
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates to milliseconds, which breaks the
+        # equality half of the seek predicate.
+        if isinstance(o, (datetime.datetime, datetime.date)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return payload['v'], payload['d']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor(token)
+
+
+def estimate_count(model):
+    """Return the planner's row estimate for model's table, or None."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 only exists once ANALYZE has been run.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    count = int(str(row[0]).split()[0])
+    return count if count >= 0 else None
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, total_count, last_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total_count = total_count
+        self.last_cursor = last_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset paginator that seeks past the last row instead of using OFFSET.
+
+    The ordering is taken from the queryset (or the model's Meta.ordering)
+    and the primary key is appended as a tie-breaker, so every page costs
+    one indexed range scan no matter how deep it is. Cursors encode the
+    ordering values of the boundary row, which keeps pages stable when new
+    rows are inserted. total_count is 'exact', 'estimate' (table statistics,
+    unfiltered querysets only) or None to skip counting altogether.
+    """
+
+    def __init__(self, queryset, per_page, total_count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.total_count = total_count
+        ordering = [
+            field for field in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(field, str)
+        ]
+        pk_name = queryset.model._meta.pk.name
+        if not any(field.lstrip('-') in ('pk', pk_name) for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(None, 'p')
+
+    def get_page(self, cursor=None):
+        queryset, seeking, backwards = self._page_queryset(cursor)
+        rows = list(queryset[:self.per_page + 1])
+        return self._page(rows, seeking, backwards, self._count())
+
+    async def aget_page(self, cursor=None):
+        queryset, seeking, backwards = self._page_queryset(cursor)
+        rows = [row async for row in queryset[:self.per_page + 1]]
+        return self._page(rows, seeking, backwards, await self._acount())
+
+    def _page_queryset(self, cursor, queryset=None):
+        values, direction = None, 'n'
+        if cursor:
+            try:
+                values, direction = decode_cursor(cursor)
+            except InvalidCursor:
+                values, direction = None, 'n'
+            if values is not None and (not isinstance(values, list) or len(values) != len(self.fields)):
+                values, direction = None, 'n'
+
+        backwards = direction == 'p'
+        ordering = [self._flip(field) for field in self.ordering] if backwards else self.ordering
+        queryset = (self.queryset if queryset is None else queryset).order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(ordering, values))
+        return queryset, values is not None, backwards
+
+    def _page(self, rows, seeking, backwards, total_count):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if (has_more and not backwards) or (seeking and backwards):
+                next_cursor = encode_cursor(self._values(rows[-1]), 'n')
+            if (has_more and backwards) or (seeking and not backwards):
+                previous_cursor = encode_cursor(self._values(rows[0]), 'p')
+
+        return CursorPage(rows, next_cursor, previous_cursor, total_count, self.last_cursor)
+
+    def _seek(self, ordering, values):
+        # (a, b, c) > (x, y, z) expanded to
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _values(self, obj):
+        return [getattr(obj, 'pk' if field == 'pk' else field) for field in self.fields]
+
+    def _count(self):
+        if self.total_count == 'exact':
+            return self.queryset.count()
+        if self.total_count == 'estimate' and not self.queryset.query.has_filters():
+            return estimate_count(self.queryset.model)
+        return None
+
+    async def _acount(self):
+        if self.total_count == 'exact':
+            return await self.queryset.acount()
+        if self.total_count == 'estimate' and not self.queryset.query.has_filters():
+            return await sync_to_async(estimate_count)(self.queryset.model)
+        return None
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def sort_rows(rows, ordering):
+    """Sort objects in place by an order_by() style list of attribute names."""
+    for field in reversed(ordering):
+        name = field.lstrip('-')
+        rows.sort(key=lambda row: getattr(row, name), reverse=field.startswith('-'))
+    return rows
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """CursorPaginator over querysets of models sharing the ordering fields.
+
+    Meant for a table and its archive: every page seeks into each
+    queryset and merges the results in Python, so it still costs one
+    range scan per queryset. Primary keys must be unique across them.
+    """
+
+    def __init__(self, querysets, per_page, total_count=None):
+        super().__init__(querysets[0], per_page, total_count)
+        self.querysets = querysets
+
+    def get_page(self, cursor=None):
+        rows = []
+        for queryset in self.querysets:
+            queryset, seeking, backwards = self._page_queryset(cursor, queryset)
+            rows.extend(queryset[:self.per_page + 1])
+        ordering = [self._flip(field) for field in self.ordering] if backwards else self.ordering
+        rows = sort_rows(rows, ordering)[:self.per_page + 1]
+        return self._page(rows, seeking, backwards, self._count())
+
+    def _count(self):
+        if self.total_count == 'exact':
+            return sum(queryset.count() for queryset in self.querysets)
+        if self.total_count == 'estimate' and not any(qs.query.has_filters() for qs in self.querysets):
+            counts = [estimate_count(queryset.model) for queryset in self.querysets]
+            return None if None in counts else sum(counts)
+        return None
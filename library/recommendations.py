@@ -0,0 +1,281 @@
+""""Borrowed together" recommendations from the circulation history.
+
+Each student's HISTORY_LIMIT most recently borrowed distinct books add
+one to every pair among them in BookPair, the upper triangle of a sparse
+book-by-book co-occurrence matrix whose diagonal counts each book's
+borrowers. Neighbours are ranked by cosine similarity,
+count(a, b) / sqrt(count(a) * count(b)), and the best TOP_K sharing at
+least MIN_SUPPORT borrowers are stored in BookRecommendation, so pages
+read them with one indexed lookup.
+
+build() recomputes everything from IssuedBook and IssuedBookArchive.
+It splits the books into id ranges and counts one range's rows of the
+matrix at a time, so memory is bounded by the partition size rather
+than the history. Only the diagonal and the cells that reach
+MIN_SUPPORT are stored; the long tail of pairs seen once is most of the
+matrix and can never be recommended. refresh() folds in loans newer
+than the stored watermark, touching only the pairs and books they
+involve. Because it only adds, and restarts unstored cells from zero,
+its counts can run slightly low until the next build().
+"""
+import heapq
+import math
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Q
+
+from .models import BookPair, BookRecommendation, IssuedBook, IssuedBookArchive, StatCounter
+
+HISTORY_LIMIT = 50
+TOP_K = 10
+MIN_SUPPORT = 2
+
+# Pairs are counted as single ints, which keeps a Counter of tens of
+# millions of cells within reach of one process.
+KEY = 1 << 32
+
+# Pair counts held in memory per build() partition, roughly 100 MB.
+PARTITION_CELLS = 1_000_000
+
+
+def _key(a, b):
+    return a * KEY + b if a <= b else b * KEY + a
+
+
+def _loans(**filters):
+    """(student_id, book_id, id) over hot and archived loans, by student then id."""
+    sources = [
+        model.objects.filter(**filters).order_by('student_id', 'id')
+        .values_list('student_id', 'book_id', 'id').iterator(chunk_size=10000)
+        for model in (IssuedBook, IssuedBookArchive)
+    ]
+    return heapq.merge(*sources, key=lambda row: (row[0], row[2]))
+
+
+def _histories(rows):
+    """Yield (student_id, distinct book ids newest first, at most HISTORY_LIMIT)."""
+    for student_id, group in groupby(rows, key=itemgetter(0)):
+        books = [book_id for _, book_id, _ in group]
+        yield student_id, list(dict.fromkeys(reversed(books)))[:HISTORY_LIMIT]
+
+
+def _latest_loan():
+    return max(
+        IssuedBook.objects.aggregate(n=Max('id'))['n'] or 0,
+        IssuedBookArchive.objects.aggregate(n=Max('id'))['n'] or 0,
+    )
+
+
+def _set_watermark(value):
+    StatCounter.objects.update_or_create(name=StatCounter.RECOMMENDATIONS_WATERMARK, defaults={'value': value})
+
+
+def _watermark():
+    counter = StatCounter.objects.filter(name=StatCounter.RECOMMENDATIONS_WATERMARK).first()
+    return counter.value if counter else None
+
+
+def rank(counts, books=None, diagonal=None):
+    """Top TOP_K (score, neighbour) for every book, or only for books.
+
+    counts maps pair keys to co-borrow counts. diagonal maps every book
+    they mention to its borrower count; by default it is read from the
+    diagonal cells in counts.
+    """
+    if diagonal is None:
+        diagonal = {}
+        for key, n in counts.items():
+            a, b = divmod(key, KEY)
+            if a == b:
+                diagonal[a] = n
+    neighbours = defaultdict(list)
+    for key, n in counts.items():
+        a, b = divmod(key, KEY)
+        if a == b or n < MIN_SUPPORT:
+            continue
+        score = n / math.sqrt(diagonal[a] * diagonal[b])
+        if books is None or a in books:
+            neighbours[a].append((score, b))
+        if books is None or b in books:
+            neighbours[b].append((score, a))
+    return {book: heapq.nlargest(TOP_K, candidates) for book, candidates in neighbours.items()}
+
+
+def _store(ranked, stale, batch_size=5000):
+    stale.delete()
+    BookRecommendation.objects.bulk_create(
+        (
+            BookRecommendation(book_id=book, recommended_id=other, rank=position, score=score)
+            for book, top in ranked.items()
+            for position, (score, other) in enumerate(top, start=1)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def _partitions(loans, max_cells):
+    """Borrower counts per book, and [lo, hi) book id ranges of about max_cells pair counts each.
+
+    A book in a history of n books is in at most n pairs, which bounds
+    the cells its row of the matrix can hold.
+    """
+    diagonal, pairs = Counter(), Counter()
+    for _, books in _histories(loans):
+        diagonal.update(books)
+        for book in books:
+            pairs[book] += len(books)
+    bounds, size = [0], 0
+    for book in sorted(pairs):
+        if size and size + pairs[book] > max_cells:
+            bounds.append(book)
+            size = 0
+        size += pairs[book]
+    bounds.append(KEY)
+    return diagonal, list(zip(bounds, bounds[1:]))
+
+
+def _count_rows(loans, lo, hi):
+    """Co-borrow counts of every pair with at least one book in [lo, hi)."""
+    counts = Counter()
+    for _, books in _histories(loans):
+        books.sort()
+        start, end = bisect_left(books, lo), bisect_left(books, hi)
+        for i in range(start, end):
+            a = books[i]
+            base = a * KEY
+            # Pairs within the range are counted from their smaller book.
+            counts.update(base + b for b in books[i:])
+            counts.update(b * KEY + a for b in books[:start])
+    return counts
+
+
+def build(batch_size=10000, max_cells=PARTITION_CELLS):
+    """Recompute the whole matrix and every book's recommendations.
+
+    Each partition of books is counted, ranked and written in its own
+    transaction, costing one more pass over the loans. The watermark is
+    cleared first, so an interrupted build is redone by the next
+    refresh(). Returns (books with recommendations, matrix cells written).
+    """
+    latest = _latest_loan()
+    StatCounter.objects.filter(name=StatCounter.RECOMMENDATIONS_WATERMARK).delete()
+    diagonal, partitions = _partitions(_loans(id__lte=latest), max_cells)
+
+    insert = f'INSERT INTO {BookPair._meta.db_table} (book_a_id, book_b_id, count) VALUES (%s, %s, %s)'
+    ranked_books = written = 0
+    for lo, hi in partitions:
+        counts = _count_rows(_loans(id__lte=latest), lo, hi)
+        cells = [
+            (key // KEY, key % KEY, n) for key, n in counts.items()
+            if lo <= key // KEY < hi and (n >= MIN_SUPPORT or key // KEY == key % KEY)
+        ]
+        ranked = rank(counts, {book for book in diagonal if lo <= book < hi}, diagonal)
+        del counts
+        with transaction.atomic():
+            BookPair.objects.filter(book_a__gte=lo, book_a__lt=hi).delete()
+            with connection.cursor() as cursor:
+                # Millions of rows; executemany skips building model instances.
+                for batch in _chunks(cells, batch_size):
+                    cursor.executemany(insert, batch)
+            _store(ranked, BookRecommendation.objects.filter(book__gte=lo, book__lt=hi))
+        ranked_books += len(ranked)
+        written += len(cells)
+    _set_watermark(latest)
+    return ranked_books, written
+
+
+def _deltas(new_loans, prior):
+    """Matrix increments for one student's new loans given their earlier history."""
+    known = set(prior)
+    added = [book for book in dict.fromkeys(reversed(new_loans)) if book not in known][:HISTORY_LIMIT]
+    window = prior[:HISTORY_LIMIT - len(added)]
+    deltas = []
+    for i, a in enumerate(added):
+        deltas.extend(_key(a, b) for b in added[i:])
+        deltas.extend(_key(a, b) for b in window)
+    return deltas
+
+
+def _pairs_for(books):
+    """Stored cells in the rows and columns of books, plus the diagonals they need."""
+    counts = {
+        _key(a, b): n
+        for a, b, n in BookPair.objects.filter(Q(book_a__in=books) | Q(book_b__in=books))
+        .values_list('book_a_id', 'book_b_id', 'count')
+    }
+    missing = {book for key in counts for book in divmod(key, KEY)} - set(books)
+    for chunk in _chunks(sorted(missing), 500):
+        counts.update(
+            (_key(a, a), n) for a, n in BookPair.objects.filter(book_a__in=chunk, book_b=F('book_a'))
+            .values_list('book_a_id', 'count')
+        )
+    return counts
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def refresh(chunk_size=500):
+    """Fold loans made since the last build or refresh into the matrix.
+
+    Falls back to build() when no watermark has been stored yet. Returns
+    (books whose recommendations were recomputed, matrix cells written).
+    """
+    watermark = _watermark()
+    if watermark is None:
+        return build()
+    latest = _latest_loan()
+    if latest <= watermark:
+        return 0, 0
+
+    new = defaultdict(list)
+    for student_id, book_id, _ in _loans(id__gt=watermark, id__lte=latest):
+        new[student_id].append(book_id)
+    deltas = Counter()
+    for students in _chunks(sorted(new), chunk_size):
+        prior = dict(_histories(_loans(student_id__in=students, id__lte=watermark)))
+        for student_id in students:
+            deltas.update(_deltas(new[student_id], prior.get(student_id, [])))
+
+    affected = sorted({book for key in deltas for book in divmod(key, KEY)})
+    by_row = defaultdict(list)
+    for key in deltas:
+        by_row[key // KEY].append(key)
+    with transaction.atomic():
+        for books in _chunks(sorted(by_row), chunk_size):
+            keys = [key for book in books for key in by_row[book]]
+            current = {
+                _key(a, b): n for a, b, n in
+                BookPair.objects.filter(book_a__in=books).values_list('book_a_id', 'book_b_id', 'count')
+            }
+            BookPair.objects.bulk_create(
+                [
+                    BookPair(book_a_id=key // KEY, book_b_id=key % KEY, count=current.get(key, 0) + deltas[key])
+                    for key in keys
+                ],
+                update_conflicts=True,
+                unique_fields=['book_a', 'book_b'],
+                update_fields=['count'],
+            )
+        for books in _chunks(affected, chunk_size):
+            _store(rank(_pairs_for(books), set(books)), BookRecommendation.objects.filter(book__in=books))
+        _set_watermark(latest)
+    return len(affected), len(deltas)
+
+
+def suggest(recommendations, exclude=(), limit=5):
+    """Merge the stored neighbours of several books into one list of Books, best first."""
+    scores = defaultdict(float)
+    books = {}
+    for recommendation in recommendations:
+        if recommendation.recommended_id in exclude:
+            continue
+        scores[recommendation.recommended_id] += recommendation.score
+        books[recommendation.recommended_id] = recommendation.recommended
+    return [books[pk] for pk in sorted(scores, key=lambda pk: (-scores[pk], pk))[:limit]]
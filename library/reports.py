@@ -0,0 +1,182 @@
+"""Circulation reports answered from daily rollups.
+
+DailyLoanRollup counts the loans issued and returned each day per book
+category and student department; DailyBookRollup counts issues per day
+and book. circulation calls record() in the transaction that issues or
+returns a loan, so the rollups are always current, and a report over
+any date range sums at most one row per bucket per day however long the
+history grows.
+
+Buckets keep the category and department in force when the loan was
+made or returned. rebuild() recomputes everything from IssuedBook and
+IssuedBookArchive; it is the only thing that forgets loans of deleted
+books and students.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Book, DailyBookRollup, DailyLoanRollup, IssuedBook, IssuedBookArchive
+
+LOAN_KEY = ('day', 'category', 'department')
+LOAN_FIELDS = ('issued', 'returned', 'returned_late', 'fines')
+BOOK_KEY = ('day', 'book_id')
+
+
+def _bucket():
+    return {'issued': 0, 'returned': 0, 'returned_late': 0, 'fines': Decimal('0')}
+
+
+def _add(model, key_fields, deltas):
+    """Add deltas, {bucket key: {field: delta}}, to the stored rollup rows.
+
+    Takes one INSERT and one UPDATE however many buckets change, so a
+    cart checkout stays within its query budget.
+    """
+    if not deltas:
+        return
+    # Create missing buckets first so concurrent writers only ever increment.
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in deltas], ignore_conflicts=True,
+    )
+    buckets = {key: Q(**dict(zip(key_fields, key))) for key in deltas}
+    fields = {field for delta in deltas.values() for field, value in delta.items() if value}
+    model.objects.filter(reduce(or_, buckets.values())).update(**{
+        field: F(field) + Case(
+            *[When(bucket, then=Value(deltas[key].get(field, 0))) for key, bucket in buckets.items()],
+            default=Value(0),
+            output_field=model._meta.get_field(field),
+        )
+        for field in fields
+    })
+
+
+def record(issued=(), returned=()):
+    """Add the loans with ids in issued and returned to the rollups.
+
+    Call inside the transaction that issues or returns them, after the
+    loan rows are written.
+    """
+    loans = defaultdict(_bucket)
+    books = Counter()
+    if issued:
+        rows = IssuedBook.objects.filter(pk__in=issued).values_list(
+            'issued_date', 'book_id', 'book__category', 'student__department',
+        )
+        for issued_date, book_id, category, department in rows:
+            day = timezone.localdate(issued_date)
+            loans[day, category, department]['issued'] += 1
+            books[day, book_id] += 1
+    if returned:
+        rows = IssuedBook.objects.filter(pk__in=returned, is_returned=True).values_list(
+            'return_date', 'due_date', 'fine_amount', 'book__category', 'student__department',
+        )
+        for return_date, due_date, fine, category, department in rows:
+            bucket = loans[return_date, category, department]
+            bucket['returned'] += 1
+            bucket['returned_late'] += return_date > due_date
+            bucket['fines'] += fine
+    _add(DailyLoanRollup, LOAN_KEY, loans)
+    _add(DailyBookRollup, BOOK_KEY, {key: {'issued': n} for key, n in books.items()})
+
+
+def compute():
+    """Return ({loan bucket key: fields}, {book bucket key: issues}) from the loan tables."""
+    loans = defaultdict(_bucket)
+    books = Counter()
+    for model in (IssuedBook, IssuedBookArchive):
+        issues = model.objects.order_by().annotate(day=TruncDate('issued_date'))
+        for day, category, department, n in (
+            issues.values_list('day', 'book__category', 'student__department').annotate(n=Count('id'))
+        ):
+            loans[day, category, department]['issued'] += n
+        for day, book_id, n in issues.values_list('day', 'book_id').annotate(n=Count('id')):
+            books[day, book_id] += n
+        returns = (
+            model.objects.filter(is_returned=True).order_by()
+            .values_list('return_date', 'book__category', 'student__department')
+            .annotate(
+                n=Count('id'),
+                late=Count('id', filter=Q(return_date__gt=F('due_date'))),
+                fines=Sum('fine_amount'),
+            )
+        )
+        for day, category, department, n, late, fines in returns:
+            bucket = loans[day, category, department]
+            bucket['returned'] += n
+            bucket['returned_late'] += late
+            bucket['fines'] += fines or 0
+    return loans, books
+
+
+def rebuild(batch_size=1000):
+    """Recompute every rollup from the loan tables; returns (loan buckets, book buckets)."""
+    loans, books = compute()
+    with transaction.atomic():
+        DailyLoanRollup.objects.all().delete()
+        DailyBookRollup.objects.all().delete()
+        DailyLoanRollup.objects.bulk_create(
+            (DailyLoanRollup(**dict(zip(LOAN_KEY, key)), **fields) for key, fields in loans.items()),
+            batch_size=batch_size,
+        )
+        DailyBookRollup.objects.bulk_create(
+            (DailyBookRollup(**dict(zip(BOOK_KEY, key)), issued=n) for key, n in books.items()),
+            batch_size=batch_size,
+        )
+    return len(loans), len(books)
+
+
+def _sums():
+    return {field: Sum(field) for field in LOAN_FIELDS}
+
+
+def _with_rate(row):
+    row = {**row, **{field: row[field] or _bucket()[field] for field in LOAN_FIELDS}}
+    # Share of the loans returned in the range that came back after their due date.
+    row['overdue_rate'] = round(row['returned_late'] / row['returned'], 4) if row['returned'] else 0
+    return row
+
+
+def _grouped(buckets, *fields, order_by):
+    return [_with_rate(row) for row in buckets.values(*fields).annotate(**_sums()).order_by(*order_by)]
+
+
+def _by_month(buckets):
+    # Summed per day in SQL and folded into months here, which avoids
+    # calling a date function on every bucket row.
+    months = {}
+    for row in buckets.values('day').annotate(**_sums()).order_by('day'):
+        month = months.setdefault(row['day'].replace(day=1), {'month': row['day'].replace(day=1), **_bucket()})
+        for field in LOAN_FIELDS:
+            month[field] += row[field] or 0
+    return [_with_rate(month) for month in months.values()]
+
+
+def report(date_from, date_to, top=10):
+    """Circulation figures for the days date_from to date_to inclusive, from the rollups alone."""
+    buckets = DailyLoanRollup.objects.filter(day__gte=date_from, day__lte=date_to)
+    most_borrowed = list(
+        DailyBookRollup.objects.filter(day__gte=date_from, day__lte=date_to)
+        .values_list('book_id').annotate(issued=Sum('issued'))
+        .order_by('-issued', 'book_id')[:top]
+    )
+    # Titles are looked up after ranking so the grouping never touches the book table.
+    books = Book.objects.in_bulk([book_id for book_id, _ in most_borrowed])
+    return {
+        'from': date_from,
+        'to': date_to,
+        'totals': _with_rate(buckets.aggregate(**_sums())),
+        'by_month': _by_month(buckets),
+        'by_category': _grouped(buckets, 'category', order_by=['-issued', 'category']),
+        'by_department': _grouped(buckets, 'department', order_by=['-issued', 'department']),
+        'most_borrowed': [
+            {'book_id': book_id, 'title': books[book_id].title, 'author': books[book_id].author, 'issued': issued}
+            for book_id, issued in most_borrowed if book_id in books
+        ],
+    }
@@ -0,0 +1,64 @@
+"""Send catalog and reporting reads to read replicas.
+
+Reads only leave the primary while ReplicaRoutingMiddleware has picked a
+replica for the current request, so management commands, migrations and
+background tasks always see the primary. Within a request, every read
+after the first write goes back to the primary, as does anything run
+inside a transaction on it.
+"""
+import contextvars
+
+from django.db import connections
+
+PRIMARY = 'default'
+
+# Apps whose reads may be served by a replica. Sessions and users stay on
+# the primary so a login is visible on the very next request.
+REPLICA_APPS = {'library'}
+
+_routing = contextvars.ContextVar('library_read_routing', default=None)
+
+
+class ReadRouting:
+    """Replica chosen for one request, and whether the request has written."""
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+def begin(replica):
+    """Route the current context's reads to replica (None for the primary)."""
+    return _routing.set(ReadRouting(replica))
+
+
+def end(token):
+    routing = _routing.get()
+    _routing.reset(token)
+    return routing
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        routing = _routing.get()
+        if routing is None or routing.replica is None or routing.wrote:
+            return PRIMARY
+        if model._meta.app_label not in REPLICA_APPS or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so rows from either relate.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == PRIMARY
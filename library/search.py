@@ -0,0 +1,90 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Lookup, Q, TextField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'library_book_fts'
+
+PG_DOCUMENT = (
+    "to_tsvector('english', library_book.isbn || ' ' || library_book.title || ' ' || "
+    "library_book.author || ' ' || library_book.publisher || ' ' || library_book.description)"
+)
+
+_fts_available = None
+
+
+class SearchDocumentField(TextField):
+    """The hidden FTS5 column named after the table, which MATCH is applied to."""
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        if connection.vendor == 'sqlite':
+            _fts_available = FTS_TABLE in connection.introspection.table_names()
+        else:
+            _fts_available = connection.vendor == 'postgresql'
+    return _fts_available
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query)
+
+
+def search_books(books, query):
+    """Filter a Book queryset to rows matching query, best matches first.
+
+    Every word in the query must match, and the last word also matches as
+    a prefix so partially typed input still finds results. Uses the FTS5
+    table on SQLite and the tsvector index on PostgreSQL, falling back to
+    icontains filters when neither is available.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return books
+
+    if not fts_available():
+        return _search_icontains(books, query)
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"' for term in terms[:-1])
+        match = f'{match} "{terms[-1]}"*'.strip()
+        # Joining the FTS table (models.BookSearchIndex) evaluates MATCH
+        # once; a correlated rank subquery would re-run the full-text query
+        # for every row.
+        books = books.filter(search_index__document__match=match)
+        return books.annotate(search_rank=F('search_index__rank')).order_by('search_rank', '-added_date')
+
+    tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    books = books.filter(RawSQL(
+        f"{PG_DOCUMENT} @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField()
+    ))
+    rank = RawSQL(
+        f"ts_rank({PG_DOCUMENT}, to_tsquery('english', %s))", [tsquery], output_field=FloatField()
+    )
+    return books.annotate(search_rank=rank).order_by('-search_rank', '-added_date')
+
+
+def _search_icontains(books, query):
+    return books.filter(
+        Q(title__icontains=query) |
+        Q(author__icontains=query) |
+        Q(isbn__icontains=query)
+    )
+
+
+def rebuild_index():
+    if connection.vendor == 'sqlite' and fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
@@ -0,0 +1,65 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from .models import Book, IssuedBook, Student, StatCounter
+
+COUNTERS = (
+    StatCounter.BOOKS,
+    StatCounter.STUDENTS,
+    StatCounter.ACTIVE_LOANS,
+    StatCounter.AVAILABLE_COPIES,
+)
+
+
+def compute():
+    return {
+        StatCounter.BOOKS: Book.objects.count(),
+        StatCounter.STUDENTS: Student.objects.count(),
+        StatCounter.ACTIVE_LOANS: IssuedBook.objects.filter(is_returned=False).count(),
+        StatCounter.AVAILABLE_COPIES: Book.objects.aggregate(total=Sum('available_copies'))['total'] or 0,
+    }
+
+
+def rebuild():
+    """Recompute every counter from the source tables to correct drift."""
+    values = compute()
+    with transaction.atomic():
+        for name, value in values.items():
+            StatCounter.objects.update_or_create(name=name, defaults={'value': value})
+    return values
+
+
+def read():
+    counters = dict(StatCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value'))
+    if any(name not in counters for name in COUNTERS):
+        counters = rebuild()
+    return counters
+
+
+async def aread():
+    rows = StatCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value')
+    counters = {name: value async for name, value in rows}
+    if any(name not in counters for name in COUNTERS):
+        counters = await sync_to_async(rebuild)()
+    return counters
+
+
+def increment(deltas, catalog=True):
+    """Apply a {counter name: delta} mapping to the stored counters in one UPDATE.
+
+    Call this inside the transaction that makes the change so the counters
+    commit or roll back with it. Any change to the book or available copy
+    counts also bumps the catalog version, unless catalog is False because
+    a Book signal has bumped it already.
+    """
+    if catalog and (deltas.get(StatCounter.BOOKS) or deltas.get(StatCounter.AVAILABLE_COPIES)):
+        deltas = {**deltas, StatCounter.CATALOG_VERSION: 1}
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    StatCounter.objects.filter(name__in=deltas).update(value=F('value') + Case(
+        *[When(name=name, then=Value(delta)) for name, delta in deltas.items()],
+        default=Value(0),
+        output_field=StatCounter._meta.get_field('value'),
+    ))
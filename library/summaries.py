@@ -0,0 +1,78 @@
+"""Maintain StudentSummary, the read model behind the student dashboard header.
+
+Every path that changes a student's loans, fines or reservations calls
+refresh() inside its own transaction, so the summary commits or rolls
+back with the change. A student without a row has no loans, fines or
+reservations.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import BookReservation, IssuedBook, Student, StudentSummary
+
+UPDATE_FIELDS = ['active_loans', 'next_due_date', 'outstanding_fines', 'active_reservations']
+
+
+def _aggregate(queryset, **aggregate):
+    return Subquery(queryset.order_by().values('student').annotate(**aggregate).values(*aggregate))
+
+
+def compute(students):
+    """Yield an unsaved StudentSummary for each student in the students queryset."""
+    loans = IssuedBook.objects.filter(student=OuterRef('pk'), is_returned=False)
+    reservations = BookReservation.objects.filter(student=OuterRef('pk'), is_active=True)
+    rows = students.order_by().annotate(
+        loan_count=Coalesce(_aggregate(loans, n=Count('id')), 0),
+        next_due=_aggregate(loans, d=Min('due_date')),
+        fines=Coalesce(_aggregate(loans, s=Sum('fine_amount')), Decimal('0')),
+        reservation_count=Coalesce(_aggregate(reservations, n=Count('id')), 0),
+    ).values_list('pk', 'loan_count', 'next_due', 'fines', 'reservation_count')
+    for pk, loan_count, next_due, fines, reservation_count in rows.iterator(chunk_size=2000):
+        yield StudentSummary(
+            student_id=pk,
+            active_loans=loan_count,
+            next_due_date=next_due,
+            outstanding_fines=fines,
+            active_reservations=reservation_count,
+        )
+
+
+def save(summaries, batch_size=1000):
+    """Upsert summaries in batches; returns how many were written."""
+    batch = []
+    count = 0
+    for summary in summaries:
+        batch.append(summary)
+        count += 1
+        if len(batch) >= batch_size:
+            _upsert(batch)
+            batch = []
+    if batch:
+        _upsert(batch)
+    return count
+
+
+def _upsert(batch):
+    StudentSummary.objects.bulk_create(
+        batch, update_conflicts=True, unique_fields=['student'], update_fields=UPDATE_FIELDS,
+    )
+
+
+def refresh(*student_ids):
+    """Recompute the summaries of the given students from the loan and reservation tables."""
+    if student_ids:
+        save(compute(Student.objects.filter(pk__in=student_ids)))
+
+
+def refresh_where(students):
+    """Recompute the summaries of every student in a Student queryset."""
+    save(compute(students))
+
+
+def rebuild():
+    """Recompute every student's summary to correct drift; returns how many were written."""
+    with transaction.atomic():
+        return save(compute(Student.objects.all()))
@@ -0,0 +1,28 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='library-task')
+
+
+def _run(fn, args, kwargs):
+    close_old_connections()
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(fn, '__name__', fn))
+    finally:
+        close_old_connections()
+
+
+def run_in_background(fn, *args, **kwargs):
+    """Run fn off the request path once the current transaction commits.
+
+    Tasks run on a small in-process thread pool, so they are lost if the
+    worker process exits; anything that must not be lost should also have
+    a management command that can redo it.
+    """
+    transaction.on_commit(lambda: _executor.submit(_run, fn, args, kwargs))
@@ -0,0 +1,10 @@
+from django import template
+
+from library import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def variant_url(field, width, fmt='jpg'):
+    return images.variant_url(field, int(width), fmt)
@@ -1,3 +1,1123 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+from datetime import date, timedelta
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    accounts, archive, catalog_cache, circulation, datagen, enrollment, exports, fines, images, imports, metrics,
+    recommendations, reports, routers, search, stats,
+)
+from .middleware import ReplicaRoutingMiddleware
+from .pagination import CursorPaginator, encode_cursor
+from .models import (
+    Book, BookPair, BookRecommendation, BookReservation, DailyBookRollup, DailyLoanRollup, IssuedBook,
+    IssuedBookArchive, StatCounter, Student, StudentSummary,
+)
+
+FULL_SCAN = re.compile(r'^SCAN (library_\w+)$')
+
+
+def make_book(isbn, title='Book', **fields):
+    fields = {
+        'author': 'Author', 'category': 'Science', 'publisher': 'Publisher',
+        'publication_date': date(2020, 1, 1), 'total_copies': 1, 'available_copies': 1, **fields,
+    }
+    return Book.objects.create(isbn=isbn, title=title, **fields)
+
+
+def make_student(username, student_id, **fields):
+    user = User.objects.create_user(username, f'{username}@example.com', 'password')
+    fields = {'phone': '0', 'address': '-', 'department': 'Physics', 'year': 1, **fields}
+    return Student.objects.create(user=user, student_id=student_id, **fields)
+
+
+class LibraryTestCase(TestCase):
+    """An admin, a student (S001) and a book with two copies; subclasses add their own fixtures."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.student = make_student('student', 'S001')
+        cls.student_user = cls.student.user
+        cls.book = make_book('9780000000001', 'Plan Testing', total_copies=2, available_copies=2)
+
+    def setUp(self):
+        # Metric snapshots and enrollment reports go to a scratch directory, not the source tree.
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        scratch = override_settings(METRICS_DIR=None, ENROLLMENT_DIR=self.directory.name)
+        scratch.enable()
+        self.addCleanup(scratch.disable)
+        # Cached pages are keyed by catalog version, which restarts with every test.
+        for cache in caches.all():
+            cache.clear()
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite specific")
+class QueryPlanTests(LibraryTestCase):
+    """Fail if any query issued by a view falls back to a full table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        IssuedBook.objects.create(book=cls.book, student=cls.student, due_date=date.today() - timedelta(days=1))
+        BookReservation.objects.create(
+            book=cls.book, student=cls.student, expiry_date=timezone.now() + timedelta(days=3),
+        )
+
+    def full_scans(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        scans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'library_' not in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                for row in cursor.fetchall():
+                    if FULL_SCAN.match(row[-1]):
+                        scans.append(f'{row[-1]}: {sql}')
+        return scans
+
+    def assertNoFullScans(self, *urls):
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.full_scans(url), [])
+
+    def test_public_views(self):
+        self.assertNoFullScans(
+            '/',
+            '/search_books/',
+            '/search_books/?category=Science',
+            '/search_books/?search=plan',
+        )
+
+    def test_admin_views(self):
+        self.client.force_login(self.admin)
+        self.assertNoFullScans(
+            '/admin_dashboard/',
+            '/view_books/',
+            '/view_books/?category=Science',
+            '/view_students/',
+            '/view_students/?department=Physics',
+            '/issued_books/?status=active',
+            '/issued_books/?status=returned',
+            '/issued_books/?status=all',
+            '/issue_book/',
+            '/autocomplete/books/?q=plan',
+            '/autocomplete/books/?q=978',
+            '/autocomplete/students/?q=s0',
+            '/autocomplete/students/?q=stu',
+            '/reports/',
+            '/reports/api/?from=2020-01-01',
+        )
+
+    def test_student_views(self):
+        self.client.force_login(self.student_user)
+        self.assertNoFullScans('/student_dashboard/')
+
+
+class QueryCountTests(LibraryTestCase):
+    """Fail if a list view loads related rows once per row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(8):
+            book = make_book(f'97800000001{i:02d}', f'Book {i}', total_copies=2)
+            IssuedBook.objects.create(book=book, student=cls.student, due_date=date.today() + timedelta(days=i))
+            BookReservation.objects.create(
+                book=book, student=cls.student, expiry_date=timezone.now() + timedelta(days=3),
+            )
+            make_student(f'student{i}', f'S1{i:02d}')
+
+    def assertWithinBudget(self, *urls):
+        for url in urls:
+            with self.subTest(url=url), self.assertNoLogs('library.middleware', 'WARNING'):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_admin_views(self):
+        self.client.force_login(self.admin)
+        self.assertWithinBudget(
+            '/admin_dashboard/',
+            '/view_students/',
+            '/issued_books/?status=active',
+            '/issued_books/?status=all',
+        )
+
+    def test_student_views(self):
+        self.client.force_login(self.student_user)
+        self.assertWithinBudget('/student_dashboard/')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Catalog reads go to a replica until the session writes."""
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        self.reads = []
+
+    def view(self, write=False):
+        def get_response(request):
+            if write:
+                self.router.db_for_write(IssuedBook)
+            self.reads.append((self.router.db_for_read(Book), self.router.db_for_read(User)))
+            return HttpResponse()
+        return ReplicaRoutingMiddleware(get_response)
+
+    def request(self, method='get', session=None):
+        request = getattr(RequestFactory(), method)('/')
+        request.session = session if session is not None else {}
+        return request
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    def test_safe_request_reads_catalog_from_replica(self):
+        self.view()(self.request())
+        self.assertEqual(self.reads, [('replica1', 'default')])
+
+    def test_unsafe_request_reads_from_primary(self):
+        self.view()(self.request('post'))
+        self.assertEqual(self.reads, [('default', 'default')])
+
+    def test_write_pins_session_to_primary(self):
+        session = {}
+        self.view(write=True)(self.request(session=session))
+        self.view()(self.request(session=session))
+        self.assertEqual(self.reads, [('default', 'default'), ('default', 'default')])
+
+        session[ReplicaRoutingMiddleware.session_key] = 0
+        self.view()(self.request(session=session))
+        self.assertEqual(self.reads[-1], ('replica1', 'default'))
+
+
+class ArchiveTests(LibraryTestCase):
+    """Archived loans leave the hot table but stay in every history view."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        book = cls.book
+        old = date.today() - timedelta(days=400)
+        cls.old = IssuedBook.objects.create(
+            book=book, student=cls.student, due_date=old, return_date=old, is_returned=True,
+        )
+        cls.recent = IssuedBook.objects.create(
+            book=book, student=cls.student, due_date=date.today(), return_date=date.today(), is_returned=True,
+        )
+        cls.active = IssuedBook.objects.create(book=book, student=cls.student, due_date=date.today())
+
+    def test_archive_moves_old_returned_loans(self):
+        self.assertEqual(archive.archive_loans(days=180, batch_size=1), 1)
+        self.assertEqual(set(IssuedBook.objects.values_list('pk', flat=True)), {self.recent.pk, self.active.pk})
+        self.assertEqual(list(IssuedBookArchive.objects.values_list('pk', flat=True)), [self.old.pk])
+
+    def test_history_includes_archive(self):
+        archive.archive_loans(days=180)
+        ids = [row[0] for row in exports.loan_rows(exports.filter_loans('all'))]
+        self.assertEqual(ids, sorted([self.old.pk, self.recent.pk, self.active.pk]))
+
+        self.client.force_login(self.admin)
+        page = self.client.get('/issued_books/?status=returned').context['page_obj']
+        self.assertEqual({loan.pk for loan in page}, {self.old.pk, self.recent.pk})
+
+    def test_export_streams_archive_and_live_loans(self):
+        archive.archive_loans(days=180)
+        self.client.force_login(self.admin)
+
+        response = self.client.get('/export_issued_books/?status=returned')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(line.decode() for line in response.streaming_content))
+        self.assertEqual(rows[0], exports.COLUMNS)
+        self.assertEqual([int(row[0]) for row in rows[1:]], sorted([self.old.pk, self.recent.pk]))
+
+        today = date.today().isoformat()
+        response = self.client.get(f'/export_issued_books/?format=jsonl&from={today}&to={today}&search=S001')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        loans = [json.loads(line) for line in response.streaming_content]
+        self.assertEqual([loan['id'] for loan in loans], sorted([self.old.pk, self.recent.pk, self.active.pk]))
+        self.assertEqual(loans[0]['isbn'], self.book.isbn)
+
+        active = self.client.get('/export_issued_books/?format=jsonl&status=active')
+        self.assertEqual([json.loads(line)['id'] for line in active.streaming_content], [self.active.pk])
+
+    def test_export_rejects_bad_parameters(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/export_issued_books/?format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/export_issued_books/?from=yesterday').status_code, 400)
+
+
+class StudentSummaryTests(LibraryTestCase):
+    """Circulation keeps StudentSummary in step and the dashboard only reads it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [make_book(f'978000000010{i}', f'Book {i}') for i in range(3)]
+
+    def summary(self):
+        summary = StudentSummary.objects.get(student=self.student)
+        return summary.active_loans, summary.next_due_date, summary.outstanding_fines, summary.active_reservations
+
+    def test_circulation_updates_summary(self):
+        loan = circulation.checkout(self.books[0], self.student, days=7)
+        circulation.checkout(self.books[1], self.student, days=3)
+        circulation.reserve(self.books[0], self.student)
+        self.assertEqual(self.summary(), (2, date.today() + timedelta(days=3), 0, 1))
+
+        IssuedBook.objects.filter(pk=loan.pk).update(due_date=date.today() - timedelta(days=2))
+        fines.accrue_fines()
+        self.assertEqual(self.summary(), (2, date.today() - timedelta(days=2), 10, 1))
+
+        circulation.return_book(IssuedBook.objects.get(pk=loan.pk))
+        self.assertEqual(self.summary(), (1, date.today() + timedelta(days=3), 0, 1))
+        self.assertEqual(
+            str(StudentSummary.objects.get(student=self.student)), "S001: 1 loan(s), 1 reservation(s)",
+        )
+
+    def test_dashboard_does_not_write(self):
+        circulation.checkout(self.books[2], self.student)
+        self.client.force_login(self.student_user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/student_dashboard/').status_code, 200)
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')], [])
+
+
+class AccountCacheTests(LibraryTestCase):
+    """With a shared cache a repeat student page view runs no session, User or Student queries."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name,
+            }},
+            SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    def bookkeeping(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [
+            q['sql'] for q in ctx.captured_queries
+            if re.search(r'FROM "(django_session|auth_user|library_student)"', q['sql'])
+        ]
+
+    def test_repeat_view_uses_cache(self):
+        self.client.force_login(self.student_user)
+        self.bookkeeping('/student_dashboard/')
+        self.assertEqual(self.bookkeeping('/student_dashboard/'), [])
+
+    def test_save_invalidates(self):
+        self.client.force_login(self.student_user)
+        self.bookkeeping('/student_dashboard/')
+        self.student.department = 'History'
+        self.student.save()
+        self.assertEqual(len(self.bookkeeping('/student_dashboard/')), 2)
+        self.assertContains(self.client.get('/student_dashboard/'), 'History')
+
+    def test_model_backend_sessions_stay_valid(self):
+        self.client.force_login(self.student_user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get('/student_dashboard/').status_code, 200)
+
+    def test_local_cache_is_not_used(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.client.force_login(self.student_user)
+            self.bookkeeping('/student_dashboard/')
+            self.assertEqual(len(self.bookkeeping('/student_dashboard/')), 2)
+            self.assertIsNone(caches['default'].get(accounts.user_key(self.student_user.pk)))
+
+
+class CartTests(LibraryTestCase):
+    """A scanned cart is issued and returned with a fixed number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [make_book(f'97800000002{i:02d}', f'Book {i}') for i in range(10)]
+        stats.rebuild()
+
+    def post(self, payload):
+        return self.client.post('/circulation/cart/', json.dumps(payload), content_type='application/json')
+
+    def test_checkout_and_return(self):
+        self.client.force_login(self.admin)
+        isbns = [book.isbn for book in self.books]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post({'action': 'checkout', 'student_id': 'S001', 'isbns': isbns + [isbns[0], 'nope']})
+        self.assertLess(len(ctx.captured_queries), 20)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['issued'] * 10 + ['error', 'error'])
+        self.assertEqual(stats.read(), stats.compute())
+
+        issue_ids = [r['issue_id'] for r in results[:10]]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post({'action': 'return', 'issue_ids': issue_ids + [issue_ids[0]]})
+        self.assertLess(len(ctx.captured_queries), 20)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['returned'] * 10 + ['error'])
+        self.assertEqual(stats.read(), stats.compute())
+        self.assertFalse(IssuedBook.objects.filter(is_returned=False).exists())
+
+    def test_rejects_bad_payload(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.post({'action': 'checkout', 'student_id': 'S001', 'isbns': 'x'}).status_code, 400)
+        self.assertEqual(self.post({'action': 'checkout', 'student_id': 'S999', 'isbns': ['x']}).status_code, 404)
+        self.assertEqual(self.post({'action': 'lend'}).status_code, 400)
+
+
+class ConditionalGetTests(LibraryTestCase):
+    """Unchanged catalog pages are answered with 304 before any listing query."""
+
+    def test_not_modified_until_catalog_changes(self):
+        url = '/search_books/?category=Science'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'library_book' in q['sql']])
+
+        self.book.title = 'Changed'
+        self.book.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_varies_by_user(self):
+        etag = self.client.get('/search_books/')['ETag']
+        self.client.force_login(self.student_user)
+        self.assertEqual(self.client.get('/search_books/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class RecommendationTests(LibraryTestCase):
+    """Books borrowed by the same students are suggested for each other."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [make_book(f'978000000040{i}', f'Book {i}', total_copies=5, available_copies=5) for i in range(3)]
+        cls.students = [cls.student] + [make_student(f'student{i}', f'S40{i}') for i in range(1, 3)]
+        a, b, c = cls.books
+        for student, books in zip(cls.students, [(a, b), (a, b), (a, c)]):
+            for book in books:
+                cls.lend(student, book)
+
+    @staticmethod
+    def lend(student, book):
+        IssuedBook.objects.create(book=book, student=student, due_date=date.today(), return_date=date.today(), is_returned=True)
+
+    def recommended(self, book):
+        return list(BookRecommendation.objects.filter(book=book).values_list('recommended_id', flat=True))
+
+    def test_build_and_refresh(self):
+        a, b, c = self.books
+        recommendations.build()
+        self.assertEqual(self.recommended(a), [b.pk])
+        self.assertEqual(self.recommended(c), [])
+
+        self.lend(self.students[2], b)
+        self.lend(self.students[1], c)
+        recommendations.refresh()
+        self.assertEqual(self.recommended(b), [a.pk, c.pk])
+        self.assertEqual(recommendations.refresh(), (0, 0))
+
+        # a and c were borrowed together once before the build, so only a rebuild sees both.
+        self.assertEqual(self.recommended(a), [b.pk])
+        recommendations.build()
+        self.assertEqual(self.recommended(a), [b.pk, c.pk])
+
+    def test_partitioned_build_matches_a_single_pass(self):
+        def matrix():
+            return (
+                sorted(BookPair.objects.values_list('book_a_id', 'book_b_id', 'count')),
+                sorted(BookRecommendation.objects.values_list('book_id', 'recommended_id', 'rank')),
+            )
+
+        self.lend(self.students[1], self.books[2])
+        recommendations.build()
+        whole = matrix()
+        # Every book gets a partition of its own.
+        self.assertEqual(recommendations.build(max_cells=1), (3, 5))
+        self.assertEqual(matrix(), whole)
+
+    def test_dashboard_suggests_unborrowed_books(self):
+        recommendations.build()
+        self.client.force_login(self.students[2].user)
+        response = self.client.get('/student_dashboard/')
+        self.assertEqual(response.context['recommended_books'], [self.books[1]])
+
+
+class ReportTests(LibraryTestCase):
+    """Circulation keeps the daily rollups current and reports read only them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.books = [
+            make_book(f'978000000050{i}', f'Report {i}', category=category, total_copies=3, available_copies=3)
+            for i, category in enumerate(['Science', 'Science', 'History'])
+        ]
+
+    def rollups(self):
+        return (
+            sorted(DailyLoanRollup.objects.values_list(
+                'day', 'category', 'department', 'issued', 'returned', 'returned_late', 'fines',
+            )),
+            sorted(DailyBookRollup.objects.values_list('day', 'book_id', 'issued')),
+        )
+
+    def test_circulation_matches_rebuild(self):
+        a, b, c = self.books
+        late = circulation.checkout(a, self.student, days=-2)
+        circulation.checkout_cart(self.student, [a.isbn, b.isbn, c.isbn])
+        circulation.return_book(late)
+        circulation.return_cart([late.pk + 2])
+        recorded = self.rollups()
+        reports.rebuild()
+        self.assertEqual(self.rollups(), recorded)
+
+        report = reports.report(date.today(), date.today())
+        self.assertEqual(report['totals']['issued'], 4)
+        self.assertEqual(report['totals']['returned'], 2)
+        self.assertEqual(report['totals']['overdue_rate'], 0.5)
+        self.assertEqual([row['category'] for row in report['by_category']], ['Science', 'History'])
+        self.assertEqual(report['most_borrowed'][0]['book_id'], a.pk)
+
+    def test_api(self):
+        circulation.checkout(self.books[0], self.student)
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/reports/api/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['by_department'][0]['department'], 'Physics')
+        self.assertFalse([q for q in ctx.captured_queries if 'library_issuedbook' in q['sql']])
+        self.assertEqual(self.client.get('/reports/api/?from=2020-02-01&to=2020-01-01').status_code, 400)
+
+
+class FineAccrualTests(LibraryTestCase):
+    """accrue_fines rewrites only the loans whose fine is out of date."""
+
+    def test_only_changed_rows_are_written(self):
+        today = date.today()
+        late = IssuedBook.objects.create(book=self.book, student=self.student, due_date=today - timedelta(days=3))
+        IssuedBook.objects.create(book=self.book, student=self.student, due_date=today + timedelta(days=3))
+        IssuedBook.objects.create(
+            book=self.book, student=self.student, due_date=today - timedelta(days=9),
+            return_date=today - timedelta(days=9), is_returned=True,
+        )
+        self.assertEqual(fines.accrue_fines(today), 1)
+        late.refresh_from_db()
+        self.assertEqual(late.fine_amount, 3 * IssuedBook.FINE_PER_DAY)
+
+        # A rerun matches no rows, so nothing is written and no summary is refreshed.
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(fines.accrue_fines(today), 0)
+        self.assertFalse([q for q in ctx.captured_queries if 'library_studentsummary' in q['sql']])
+        self.assertEqual(
+            sorted(IssuedBook.objects.values_list('fine_amount', flat=True)), [0, 0, 3 * IssuedBook.FINE_PER_DAY],
+        )
+
+        self.assertEqual(fines.accrue_fines(today + timedelta(days=1)), 1)
+        late.refresh_from_db()
+        self.assertEqual(late.fine_amount, 4 * IssuedBook.FINE_PER_DAY)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "checks the SQLite FTS5 table")
+class SearchIndexTests(LibraryTestCase):
+    """The full-text index follows edits and deletes and is matched once per query."""
+
+    def titles(self, query):
+        return [book.title for book in search.search_books(Book.objects.all(), query)]
+
+    def test_index_follows_edits_and_deletes(self):
+        book = make_book('9780000000602', 'Quantum Gardens')
+        self.assertEqual(self.titles('quantum'), ['Quantum Gardens'])
+        self.assertEqual(self.titles('gardens quan'), ['Quantum Gardens'])
+
+        book.title = 'Silent River'
+        book.save()
+        self.assertEqual(self.titles('quantum'), [])
+        self.assertEqual(self.titles('river'), ['Silent River'])
+
+        book.delete()
+        self.assertEqual(self.titles('river'), [])
+
+    def test_rank_is_not_a_correlated_subquery(self):
+        make_book('9780000000603', 'Quantum Gardens')
+        with CaptureQueriesContext(connection) as ctx:
+            self.titles('quantum')
+        self.assertEqual(ctx.captured_queries[-1]['sql'].count('MATCH'), 1)
+
+
+class CursorPaginationTests(LibraryTestCase):
+    """Keyset pages move forwards, backwards and to the end, and shrug off bad cursors."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(1, 6):
+            make_student(f'student{i}', f'S10{i}')
+
+    def ids(self, page):
+        return [student.student_id for student in page]
+
+    def test_next_previous_and_last(self):
+        paginator = CursorPaginator(Student.objects.all(), 2)
+        first = paginator.get_page()
+        self.assertEqual(self.ids(first), ['S001', 'S101'])
+        self.assertFalse(first.has_previous())
+
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(self.ids(second), ['S102', 'S103'])
+        self.assertEqual(self.ids(paginator.get_page(second.previous_cursor)), ['S001', 'S101'])
+
+        last = paginator.get_page(first.last_cursor)
+        self.assertEqual(self.ids(last), ['S104', 'S105'])
+        self.assertFalse(last.has_next())
+        self.assertEqual(self.ids(paginator.get_page(last.previous_cursor)), ['S102', 'S103'])
+
+    def test_invalid_cursor_starts_over(self):
+        paginator = CursorPaginator(Student.objects.all(), 2)
+        for cursor in ['not-a-cursor', encode_cursor(['S101'], 'x'), encode_cursor('S101', 'n')]:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.ids(paginator.get_page(cursor)), ['S001', 'S101'])
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/view_students/?cursor=%%%').status_code, 200)
+
+
+class StatCounterTests(LibraryTestCase):
+    """The dashboard counters move with circulation and never need a recount."""
+
+    def setUp(self):
+        super().setUp()
+        stats.rebuild()
+
+    def counter_updates(self, ctx):
+        return [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "library_statcounter"')]
+
+    def test_checkout_and_return(self):
+        with CaptureQueriesContext(connection) as ctx:
+            loan = circulation.checkout(self.book, self.student)
+        self.assertEqual(len(self.counter_updates(ctx)), 1)
+        counters = stats.read()
+        self.assertEqual(counters, stats.compute())
+        self.assertEqual(counters[StatCounter.ACTIVE_LOANS], 1)
+        self.assertEqual(counters[StatCounter.AVAILABLE_COPIES], 1)
+
+        circulation.return_book(loan)
+        counters = stats.read()
+        self.assertEqual(counters, stats.compute())
+        self.assertEqual(counters[StatCounter.ACTIVE_LOANS], 0)
+        self.assertEqual(counters[StatCounter.AVAILABLE_COPIES], 2)
+
+    def test_add_and_delete_book(self):
+        self.client.force_login(self.admin)
+        self.client.post('/add_book/', {
+            'isbn': '9780000000002', 'title': 'Counted', 'author': 'Author', 'category': 'Science',
+            'publisher': 'Publisher', 'publication_date': '2020-01-01', 'total_copies': 3,
+        })
+        self.assertEqual(stats.read(), stats.compute())
+        self.assertEqual(stats.read()[StatCounter.BOOKS], 2)
+
+        circulation.checkout(self.book, self.student)
+        version = catalog_cache.version()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(f'/delete_book/{self.book.id}/')
+        self.assertEqual(len(self.counter_updates(ctx)), 2)
+        self.assertEqual(catalog_cache.version(), version + 1)
+        counters = stats.read()
+        self.assertEqual(counters, stats.compute())
+        self.assertEqual(counters[StatCounter.ACTIVE_LOANS], 0)
+        self.assertEqual(counters[StatCounter.AVAILABLE_COPIES], 3)
+
+
+class ImportTests(LibraryTestCase):
+    """Imports upsert on ISBN, keep copies on loan out, and report what they skip."""
+
+    def record(self, isbn, total_copies, **fields):
+        return {
+            'isbn': isbn, 'title': 'Imported', 'author': 'Author', 'category': 'Science',
+            'publication_date': '2021', 'total_copies': total_copies, **fields,
+        }
+
+    def test_upsert_moves_available_copies_by_the_change(self):
+        book = make_book('9780000000019', total_copies=2, available_copies=2)
+        circulation.checkout(book, self.student)
+        stats.rebuild()
+
+        processed, created, rejected = imports.import_books([
+            self.record('978-0-00-000001-9', 4), self.record('9780000000002', 3),
+        ])
+        self.assertEqual((processed, created, rejected), (2, 1, 0))
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.total_copies, book.available_copies), ('Imported', 4, 3))
+        self.assertEqual(stats.read(), stats.compute())
+
+        imports.import_books([self.record('9780000000019', 1)])
+        book.refresh_from_db()
+        self.assertEqual((book.total_copies, book.available_copies), (1, 0))
+        self.assertEqual(stats.read(), stats.compute())
+
+    def test_rejects_are_reported_with_line_numbers(self):
+        rejects = []
+        records = imports.read_jsonl(io.StringIO('\n'.join([
+            json.dumps(self.record('9780000000002', 1)),
+            json.dumps(self.record('9780000000003', 1)),
+            '{not json',
+            json.dumps(self.record('9780000000019', 1, category='Astrology')),
+        ])))
+        result = imports.import_books(
+            records, batch_size=1, on_reject=lambda n, record, reason: rejects.append((n, reason)),
+        )
+
+        self.assertEqual(result, (4, 1, 3))
+        self.assertEqual([n for n, reason in rejects], [2, 3, 4])
+        self.assertIn('invalid ISBN', rejects[0][1])
+        self.assertIn('invalid JSON', rejects[1][1])
+        self.assertIn('unknown category', rejects[2][1])
+
+
+class EnrollmentTests(LibraryTestCase):
+    """Bulk enrollment skips and reports duplicates, and never keeps the roster."""
+
+    ROSTER = (
+        "username,password,first_name,last_name,student_id,department,year\n"
+        "new1,secret,New,One,S201,Physics,1\n"
+        "student,secret,Taken,Username,S202,Physics,1\n"
+        "new2,secret,Taken,Id,S001,Physics,1\n"
+        "new1,secret,Repeated,Username,S203,Physics,1\n"
+        "new3,secret,New,Three,S204,Physics,2\n"
+    )
+
+    def test_duplicates_are_reported_and_roster_deleted(self):
+        path = os.path.join(self.directory.name, 'roster.csv')
+        with open(path, 'w') as handle:
+            handle.write(self.ROSTER)
+        report_path = os.path.join(self.directory.name, 'report.jsonl')
+
+        self.assertEqual(enrollment.enroll_upload(path, report_path=report_path, workers=1), (5, 2, 3))
+        self.assertFalse(os.path.exists(path))
+        self.assertCountEqual(Student.objects.values_list('student_id', flat=True), ['S001', 'S201', 'S204'])
+        with open(report_path) as handle:
+            lines = [json.loads(line) for line in handle]
+        self.assertEqual([line['row'] for line in lines[:-1]], [2, 3, 4])
+        self.assertEqual(
+            [line['reason'] for line in lines[:-1]],
+            ["duplicate username 'student'", "duplicate student_id 'S001'", "duplicate username 'new1'"],
+        )
+        self.assertNotIn('password', lines[0]['data'])
+        self.assertEqual(lines[-1], {'processed': 5, 'created': 2, 'rejected': 3})
+
+    def test_post_without_file(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/enroll_students/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Choose a roster file")
+
+
+class ImageVariantTests(LibraryTestCase):
+    """Covers are served as resized variants once generated, and as the original until then."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, name, size):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'navy').save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_variants_are_named_and_sized(self):
+        name = self.upload('book_covers/cover.png', (1000, 1500))
+        self.assertEqual(images.generate_variants(name), 4)
+        self.assertEqual(images.variant_name(name, 640, 'webp'), 'book_covers/derived/cover_640.webp')
+        with default_storage.open(images.variant_name(name, 320, 'jpg')) as handle:
+            self.assertEqual(Image.open(handle).size, (320, 480))
+        self.assertEqual(images.generate_variants(name), 0)
+
+    def test_small_originals_are_not_upscaled(self):
+        name = self.upload('student_profiles/face.png', (120, 120))
+        self.assertEqual(images.generate_variants(name), 2)
+        self.assertFalse(default_storage.exists(images.variant_name(name, 300, 'jpg')))
+
+    def test_urls_fall_back_to_the_original(self):
+        self.book.cover_image = self.upload('book_covers/cover.png', (800, 1200))
+        self.book.save()
+        self.assertEqual(images.variant_url(self.book.cover_image, 320, 'webp'), '/media/book_covers/cover.png')
+        self.assertEqual(images.variant_url(Book().cover_image, 320, 'webp'), '')
+
+        images.generate_variants(self.book.cover_image.name)
+        self.client.force_login(self.student_user)
+        response = self.client.get('/search_books/')
+        self.assertContains(response, '/media/book_covers/derived/cover_320.webp 320w')
+        self.assertContains(response, 'src="/media/book_covers/derived/cover_320.jpg"')
+
+
+class MetricsTests(LibraryTestCase):
+    """/metrics is private, speaks the Prometheus text format, and sees async views' queries."""
+
+    def setUp(self):
+        super().setUp()
+        overrides = override_settings(METRICS_DIR=self.directory.name, METRICS_TOKEN='s3cret')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def observed(self, view):
+        """(requests, queries) recorded so far for view."""
+        series = metrics.collect()[0]['library_db_queries'].get(view, [0, 0])
+        return sum(series[:-1]), series[-1]
+
+    def test_requires_token_or_superuser(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.client.force_login(self.student_user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_prometheus_format(self):
+        self.client.get('/search_books/')
+        self.client.force_login(self.admin)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE library_request_duration_seconds histogram', body)
+        self.assertIn('# TYPE library_catalog_cache_hits_total counter', body)
+        self.assertRegex(body, r'library_db_queries_bucket\{view="search_books",le="\+Inf"\} \d+')
+        self.assertRegex(body, r'library_db_queries_count\{view="search_books"\} \d+')
+        self.assertTrue(body.endswith('\n'))
+
+    async def test_async_view_queries_are_counted(self):
+        requests, queries = await sync_to_async(self.observed)('index')
+        response = await self.async_client.get('/')
+        self.assertEqual(response.status_code, 200)
+        after = await sync_to_async(self.observed)('index')
+        self.assertEqual(after[0], requests + 1)
+        self.assertGreater(after[1], queries)
+
+
+class WaitlistTests(LibraryTestCase):
+    """Returned copies go to the longest-waiting student; lapsed holds pass down the line."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.single = make_book('9780000000002', 'Single Copy')
+        cls.second = make_student('second', 'S002')
+        cls.third = make_student('third', 'S003')
+
+    def status(self, reservation):
+        reservation.refresh_from_db()
+        return reservation.status
+
+    def positions(self):
+        reservations = circulation.with_queue_position(
+            BookReservation.objects.filter(book=self.single, status=BookReservation.WAITING)
+        )
+        return dict(reservations.values_list('student__student_id', 'queue_position'))
+
+    def test_returns_hold_for_the_head_of_the_queue(self):
+        loan = circulation.checkout(self.single, self.student)
+        second = circulation.reserve(self.single, self.second)
+        third = circulation.reserve(self.single, self.third)
+        self.assertEqual((second.status, third.status), (BookReservation.WAITING, BookReservation.WAITING))
+        self.assertEqual(self.positions(), {'S002': 1, 'S003': 2})
+        with self.assertRaises(circulation.AlreadyReserved):
+            circulation.reserve(self.single, self.third)
+
+        circulation.return_book(loan)
+        self.single.refresh_from_db()
+        self.assertEqual(self.single.available_copies, 0)
+        self.assertEqual(self.status(second), BookReservation.HELD)
+        self.assertEqual(self.positions(), {'S003': 1})
+
+        circulation.checkout(self.single, self.second)
+        self.assertEqual(self.status(second), BookReservation.FULFILLED)
+        with self.assertRaises(circulation.NoCopiesAvailable):
+            circulation.checkout(self.single, self.student)
+
+    def test_lapsed_hold_passes_to_the_next_in_line(self):
+        loan = circulation.checkout(self.single, self.student)
+        second = circulation.reserve(self.single, self.second)
+        third = circulation.reserve(self.single, self.third)
+        circulation.return_book(loan)
+
+        BookReservation.objects.filter(pk=second.pk).update(expiry_date=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(circulation.expire_reservations(), (0, 1, 0))
+        self.assertEqual(self.status(second), BookReservation.EXPIRED)
+        self.assertEqual(self.status(third), BookReservation.HELD)
+
+        BookReservation.objects.filter(pk=third.pk).update(expiry_date=timezone.now() - timedelta(minutes=1))
+        circulation.expire_reservations()
+        self.single.refresh_from_db()
+        self.assertEqual(self.single.available_copies, 1)
+
+    def test_search_offers_the_waitlist(self):
+        circulation.checkout(self.single, self.student)
+        self.client.force_login(self.second.user)
+        response = self.client.get('/search_books/?search=single')
+        self.assertContains(response, 'Out of Stock')
+        self.assertContains(response, '#1 in line')
+
+        self.client.get(f'/reserve_book/{self.single.id}/')
+        response = self.client.get('/search_books/?search=single', follow=True)
+        self.assertContains(response, '#2 in line')
+        self.assertContains(response, 'You are #1 on the waitlist')
+
+
+class CatalogCacheTests(LibraryTestCase):
+    """Rendered catalog grids are reused until a book changes, and never after."""
+
+    def lookups(self):
+        counters = metrics.counter_values()
+        return counters[catalog_cache.HITS], counters[catalog_cache.MISSES]
+
+    def test_book_save_and_delete_invalidate(self):
+        hits, misses = self.lookups()
+        self.client.get('/search_books/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/search_books/')
+        self.assertContains(response, 'Plan Testing')
+        self.assertFalse([q for q in ctx.captured_queries if 'library_book' in q['sql']])
+        self.assertEqual(self.lookups(), (hits + 1, misses + 1))
+
+        version = catalog_cache.version()
+        self.book.title = 'Renamed'
+        self.book.save()
+        self.assertGreater(catalog_cache.version(), version)
+        response = self.client.get('/search_books/')
+        self.assertContains(response, 'Renamed')
+        self.assertNotContains(response, 'Plan Testing')
+
+        version = catalog_cache.version()
+        self.book.delete()
+        self.assertGreater(catalog_cache.version(), version)
+        self.assertNotContains(self.client.get('/search_books/'), 'Renamed')
+
+
+class DataGenTests(LibraryTestCase):
+    """Generated ISBNs stay valid at any supported size and never reuse another run's range."""
+
+    def test_isbns_are_sized_from_the_count(self):
+        block, width = datagen.isbn_block('gen', 1_000_001)
+        self.assertEqual(width, 7)
+        for number in (0, 1_000_000):
+            isbn = datagen.isbn13(block, width, number)
+            self.assertEqual(len(isbn), 13)
+            self.assertEqual(imports.normalize_isbn(isbn), isbn)
+        with self.assertRaises(datagen.GenerationError):
+            datagen.isbn_block('gen', 10 ** 8 + 1)
+
+    def test_reused_prefix_is_rejected(self):
+        datagen.Generator(prefix='dup').generate_books(5)
+        self.assertEqual(Book.objects.count(), 6)
+        with self.assertRaisesMessage(CommandError, "pass another --prefix"):
+            call_command('generate_library_data', books=5, students=0, loans=0, reservations=0, prefix='dup')
+        self.assertEqual(Book.objects.count(), 6)
+
+    def test_prefix_only_clashes_with_generated_users(self):
+        make_student('genevieve', 'S002')
+        call_command(
+            'generate_library_data', books=1, students=1, loans=0, reservations=0, prefix='gen',
+            stdout=io.StringIO(), stderr=io.StringIO(),
+        )
+        self.assertTrue(User.objects.filter(username='gen0000000').exists())
+        with self.assertRaisesMessage(CommandError, "pass another --prefix"):
+            call_command('generate_library_data', books=1, students=1, loans=0, reservations=0, prefix='gen')
+
+
+class HandlerViewTests(LibraryTestCase):
+    """WSGI requests run the sync views and ASGI requests their async twins, with the same results."""
+
+    async def aget(self, url, user=None):
+        if user:
+            await self.async_client.aforce_login(user)
+        return await self.async_client.get(url)
+
+    def test_each_handler_runs_its_own_implementation(self):
+        self.client.force_login(self.student_user)
+        for url, name in [
+            ('/', 'index'), ('/search_books/', 'search_books'), ('/student_dashboard/', 'student_dashboard'),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).resolver_match.func.__name__, name)
+                response = async_to_sync(self.aget)(url, self.student_user)
+                self.assertEqual(response.resolver_match.func.__name__, f'a{name}')
+
+    def test_anonymous(self):
+        for get in (self.client.get, async_to_sync(self.aget)):
+            with self.subTest(get=get):
+                self.assertEqual(get('/').status_code, 200)
+                self.assertNotContains(get('/search_books/'), '/reserve_book/')
+                response = get('/student_dashboard/')
+                self.assertRedirects(response, '/student_login?next=/student_dashboard/', fetch_redirect_response=False)
+
+    def test_user_without_student_profile(self):
+        self.client.force_login(self.admin)
+        responses = [self.client.get('/student_dashboard/'), async_to_sync(self.aget)('/student_dashboard/', self.admin)]
+        for response in responses:
+            self.assertRedirects(response, '/', fetch_redirect_response=False)
+
+    def test_student_dashboard_matches(self):
+        loan = circulation.checkout(self.book, self.student)
+        self.client.force_login(self.student_user)
+        sync = self.client.get('/student_dashboard/')
+        asynchronous = async_to_sync(self.aget)('/student_dashboard/', self.student_user)
+        for response in (sync, asynchronous):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['student'], self.student)
+            self.assertEqual(response.context['issued_books'], [loan])
+        self.assertEqual(
+            [book.pk for book in sync.context['recommended_books']],
+            [book.pk for book in asynchronous.context['recommended_books']],
+        )
+
+
+class AutocompleteTests(LibraryTestCase):
+    """Prefix suggestions for the issue form, answered from the index in index order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.lowercase = make_book('9780000000019', 'planets')
+        cls.held = make_book('9780000000002', 'Plankton', available_copies=0)
+        cls.out = make_book('9780000000026', 'Plain Sailing', available_copies=0)
+        make_book('9780000000033', 'A Plan')
+        BookReservation.objects.create(
+            book=cls.held, student=cls.student, status=BookReservation.HELD,
+            expiry_date=timezone.now() + timedelta(days=3),
+        )
+
+    def suggest(self, url):
+        self.client.force_login(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_books_by_title_prefix(self):
+        results = self.suggest('/autocomplete/books/?q=PLA')
+        # Case-insensitive, in title order; books out of stock only show while held.
+        self.assertEqual([book['title'] for book in results], ['Plan Testing', 'planets', 'Plankton'])
+        self.assertEqual(self.suggest('/autocomplete/books/?q=pla&limit=1'), results[:1])
+
+    def test_books_by_isbn_prefix(self):
+        results = self.suggest('/autocomplete/books/?q=978-00000000')
+        self.assertEqual(
+            [book['isbn'] for book in results], ['9780000000001', '9780000000002', '9780000000019', '9780000000033'],
+        )
+
+    def test_students(self):
+        other = make_student('ada', 'S002', is_active=False)
+        other.user.first_name = 'Stuart'
+        other.user.save()
+        self.student_user.first_name = 'Stella'
+        self.student_user.save()
+        self.assertEqual([s['student_id'] for s in self.suggest('/autocomplete/students/?q=st')], ['S001'])
+        self.assertEqual([s['student_id'] for s in self.suggest('/autocomplete/students/?q=s00')], ['S001'])
+
+    def test_admin_only(self):
+        self.client.force_login(self.student_user)
+        for url in ('/autocomplete/books/?q=pla', '/autocomplete/students/?q=s'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_books_not_modified_until_counters_change(self):
+        url = '/autocomplete/books/?q=pla'
+        self.client.force_login(self.admin)
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'library_book' in q['sql']])
+
+        circulation.checkout(self.lowercase, self.student)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('planets', [book['title'] for book in response.json()['results']])
+
+
+class CirculationTests(LibraryTestCase):
+    """Copy counts only move through conditional updates, so a race cannot over-issue or double-count."""
+
+    def setUp(self):
+        super().setUp()
+        stats.rebuild()
+
+    def edit(self, book, total_copies):
+        self.client.force_login(self.admin)
+        return self.client.post(f'/edit_book/{book.id}/', {
+            'isbn': book.isbn, 'title': 'Renamed', 'author': book.author, 'category': book.category,
+            'publisher': book.publisher, 'publication_date': '2020-01-01', 'total_copies': total_copies,
+        })
+
+    def test_last_copy_is_issued_once(self):
+        book = make_book('9780000000019', 'Single Copy')
+        circulation.checkout(book, self.student)
+        counters = stats.read()
+        with self.assertRaises(circulation.NoCopiesAvailable):
+            circulation.checkout(book, self.student)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(IssuedBook.objects.filter(book=book).count(), 1)
+        self.assertEqual(stats.read(), counters)
+
+    def test_double_return(self):
+        loan = circulation.checkout(self.book, self.student)
+        circulation.return_book(IssuedBook.objects.get(pk=loan.pk))
+        counters = stats.read()
+        with self.assertRaises(circulation.AlreadyReturned):
+            circulation.return_book(IssuedBook.objects.get(pk=loan.pk))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+        self.assertEqual(stats.read(), counters)
+
+    def test_edit_book_keeps_loans_made_while_the_form_was_open(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        circulation.checkout(self.book, self.student)
+        self.edit(stale, 3)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.total_copies, self.book.available_copies), ('Renamed', 3, 2))
+        self.assertEqual(stats.read(), stats.compute())
+
+    def test_edit_book_cannot_remove_copies_on_loan(self):
+        circulation.checkout(self.book, self.student)
+        response = self.edit(self.book, 0)
+        self.assertRedirects(response, f'/edit_book/{self.book.id}/', fetch_redirect_response=False)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.total_copies, self.book.available_copies), ('Plan Testing', 2, 1))
+
+        self.edit(self.book, 1)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (1, 0))
+        self.assertEqual(stats.read(), stats.compute())
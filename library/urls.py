@@ -16,14 +16,38 @@ urlpatterns = [
     path("delete_book/<int:book_id>/", views.delete_book, name="delete_book"),
     
     path("add_student/", views.add_student, name="add_student"),
+    path("enroll_students/", views.enroll_students, name="enroll_students"),
     path("view_students/", views.view_students, name="view_students"),
     path("edit_student/<int:student_id>/", views.edit_student, name="edit_student"),
     path("delete_student/<int:student_id>/", views.delete_student, name="delete_student"),
     
     path("issue_book/", views.issue_book, name="issue_book"),
     path("issued_books/", views.issued_books, name="issued_books"),
+    path("autocomplete/books/", views.autocomplete_books, name="autocomplete_books"),
+    path("autocomplete/students/", views.autocomplete_students, name="autocomplete_students"),
     path("return_book/<int:issue_id>/", views.return_book, name="return_book"),
+    path("circulation/cart/", views.circulation_cart, name="circulation_cart"),
+    path("export_issued_books/", views.export_issued_books, name="export_issued_books"),
+    path("reports/", views.circulation_reports, name="circulation_reports"),
+    path("reports/api/", views.circulation_reports_api, name="circulation_reports_api"),
     
     path("search_books/", views.search_books, name="search_books"),
     path("reserve_book/<int:book_id>/", views.reserve_book, name="reserve_book"),
+    
+    path("metrics", views.prometheus_metrics, name="metrics"),
+]
+
+# Requests arriving through the ASGI handler resolve against these instead
+# (see library.middleware.ASGIURLConfMiddleware), so the pages with an
+# async implementation run it there and their sync one under WSGI.
+ASYNC_VIEWS = {
+    'index': views.aindex,
+    'student_dashboard': views.astudent_dashboard,
+    'search_books': views.asearch_books,
+}
+
+async_urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urlpatterns
 ]
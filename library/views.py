@@ -1,27 +1,46 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.contrib.auth import authenticate, login, logout
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q
 from datetime import datetime, timedelta
-from .models import Book, Student, IssuedBook, BookReservation
+from .models import Book, Student, StudentSummary, IssuedBook, IssuedBookArchive, BookReservation, BookRecommendation, StatCounter
+from . import autocomplete, catalog_cache, circulation, conditional, enrollment, exports, images, metrics, recommendations, reports, search, stats, summaries, tasks
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.conf import settings
+import asyncio
+import hmac
+import json
+import os
+import tempfile
+from asgiref.sync import sync_to_async
+from .pagination import CursorPaginator, MergedCursorPaginator
 
-def index(request):
-    total_books = Book.objects.count()
-    total_students = Student.objects.count()
-    issued_books = IssuedBook.objects.filter(is_returned=False).count()
-    available_books = Book.objects.aggregate(total=Count('available_copies'))
-    
-    context = {
-        'total_books': total_books,
-        'total_students': total_students,
-        'issued_books': issued_books,
-        'available_books': available_books,
+# index, student_dashboard and search_books each have an async twin
+# (aindex, ...) that library.urls routes ASGI requests to; WSGI requests
+# run the sync view directly instead of through async_to_sync.
+
+def _index_context(counters):
+    return {
+        'total_books': counters[StatCounter.BOOKS],
+        'total_students': counters[StatCounter.STUDENTS],
+        'issued_books': counters[StatCounter.ACTIVE_LOANS],
+        'available_books': counters[StatCounter.AVAILABLE_COPIES],
     }
-    return render(request, 'library/index.html', context)
+
+@conditional.etag(conditional.counters)
+def index(request):
+    return render(request, 'library/index.html', _index_context(stats.read()))
+
+@conditional.etag(conditional.counters)
+async def aindex(request):
+    request.user = await request.auser()
+    return render(request, 'library/index.html', _index_context(await stats.aread()))
 
 def admin_login(request):
     if request.method == "POST":
@@ -76,43 +95,86 @@ def admin_dashboard(request):
     if not request.user.is_superuser:
         return redirect('/')
     
-    total_books = Book.objects.count()
-    total_students = Student.objects.count()
-    issued_books = IssuedBook.objects.filter(is_returned=False).count()
+    counters = stats.read()
     overdue_books = IssuedBook.objects.filter(is_returned=False, due_date__lt=datetime.now().date()).count()
     recent_books = Book.objects.all()[:5]
-    recent_issues = IssuedBook.objects.filter(is_returned=False)[:5]
+    recent_issues = IssuedBook.objects.filter(is_returned=False).select_related('book', 'student')[:5]
     
     context = {
-        'total_books': total_books,
-        'total_students': total_students,
-        'issued_books': issued_books,
+        'total_books': counters[StatCounter.BOOKS],
+        'total_students': counters[StatCounter.STUDENTS],
+        'issued_books': counters[StatCounter.ACTIVE_LOANS],
         'overdue_books': overdue_books,
         'recent_books': recent_books,
         'recent_issues': recent_issues,
     }
     return render(request, 'library/admin_dashboard.html', context)
 
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+def _dashboard_lists(student):
+    """Querysets for the dashboard's loans, recent history (live and archived) and reservations."""
+    return (
+        IssuedBook.objects.filter(student=student, is_returned=False).select_related('book'),
+        IssuedBook.objects.filter(student=student, is_returned=True).select_related('book')[:5],
+        IssuedBookArchive.objects.filter(student=student).select_related('book')[:5],
+        circulation.with_queue_position(
+            BookReservation.objects.filter(student=student, is_active=True).select_related('book')
+        ),
+    )
+
+def _dashboard_context(student, summary, issued_books, book_history, archived_history, reservations):
+    summary = summary or StudentSummary(student=student)
+    book_history = sorted(book_history + archived_history, key=lambda loan: loan.issued_date, reverse=True)[:5]
+    return {
+        'student': student,
+        'summary': summary,
+        'issued_books': issued_books,
+        'book_history': book_history,
+        'reservations': reservations,
+        'recommended_books': [],
+        'total_fines': summary.outstanding_fines,
+        'today': datetime.now().date(),
+    }
+
+def _borrowed(context):
+    return {loan.book_id for loan in context['issued_books'] + context['book_history']}
+
+def _recommendation_rows(borrowed):
+    return BookRecommendation.objects.filter(book__in=borrowed).select_related('recommended')
+
 @login_required(login_url='/student_login')
 def student_dashboard(request):
-    try:
-        student = Student.objects.get(user=request.user)
-        issued_books = IssuedBook.objects.filter(student=student, is_returned=False)
-        book_history = IssuedBook.objects.filter(student=student, is_returned=True)[:5]
-        reservations = BookReservation.objects.filter(student=student, is_active=True)
-        total_fines = sum([book.calculate_fine() for book in issued_books])
-        
-        context = {
-            'student': student,
-            'issued_books': issued_books,
-            'book_history': book_history,
-            'reservations': reservations,
-            'total_fines': total_fines,
-        }
-        return render(request, 'library/student_dashboard.html', context)
-    except Student.DoesNotExist:
+    student = request.student
+    if not student:
+        messages.error(request, "Student profile not found.")
+        return redirect('/')
+    summary = StudentSummary.objects.filter(student=student).first()
+    context = _dashboard_context(student, summary, *(list(rows) for rows in _dashboard_lists(student)))
+    borrowed = _borrowed(context)
+    if borrowed:
+        context['recommended_books'] = recommendations.suggest(list(_recommendation_rows(borrowed)), exclude=borrowed)
+    return render(request, 'library/student_dashboard.html', context)
+
+@login_required(login_url='/student_login')
+async def astudent_dashboard(request):
+    request.user = await request.auser()
+    student = await request.astudent()
+    if not student:
         messages.error(request, "Student profile not found.")
         return redirect('/')
+    summary, *lists = await asyncio.gather(
+        StudentSummary.objects.filter(student=student).afirst(),
+        *(_alist(rows) for rows in _dashboard_lists(student)),
+    )
+    context = _dashboard_context(student, summary, *lists)
+    borrowed = _borrowed(context)
+    if borrowed:
+        context['recommended_books'] = recommendations.suggest(
+            await _alist(_recommendation_rows(borrowed)), exclude=borrowed,
+        )
+    return render(request, 'library/student_dashboard.html', context)
 
 @login_required(login_url='/admin_login')
 def add_book(request):
@@ -130,24 +192,30 @@ def add_book(request):
         description = request.POST.get('description', '')
         cover_image = request.FILES.get('cover_image')
         
-        book = Book.objects.create(
-            isbn=isbn,
-            title=title,
-            author=author,
-            category=category,
-            publisher=publisher,
-            publication_date=publication_date,
-            total_copies=total_copies,
-            available_copies=total_copies,
-            description=description,
-            cover_image=cover_image
-        )
+        with transaction.atomic():
+            book = Book.objects.create(
+                isbn=isbn,
+                title=title,
+                author=author,
+                category=category,
+                publisher=publisher,
+                publication_date=publication_date,
+                total_copies=total_copies,
+                available_copies=total_copies,
+                description=description,
+                cover_image=cover_image
+            )
+            # The Book post_save signal has bumped the catalog version.
+            stats.increment({StatCounter.BOOKS: 1, StatCounter.AVAILABLE_COPIES: int(total_copies)}, catalog=False)
+            if book.cover_image:
+                tasks.run_in_background(images.generate_variants, book.cover_image.name)
         messages.success(request, f"Book '{title}' added successfully!")
         return redirect('/view_books')
     
     return render(request, 'library/add_book.html')
 
 @login_required(login_url='/admin_login')
+@conditional.etag(conditional.catalog_version)
 def view_books(request):
     if not request.user.is_superuser:
         return redirect('/')
@@ -158,18 +226,13 @@ def view_books(request):
     books = Book.objects.all()
     
     if search_query:
-        books = books.filter(
-            Q(title__icontains=search_query) |
-            Q(author__icontains=search_query) |
-            Q(isbn__icontains=search_query)
-        )
+        books = search.search_books(books, search_query)
     
     if category_filter:
         books = books.filter(category=category_filter)
     
-    paginator = Paginator(books, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(books, 10, total_count='estimate')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     categories = Book.CATEGORY_CHOICES
     
@@ -195,13 +258,25 @@ def edit_book(request, book_id):
         book.category = request.POST['category']
         book.publisher = request.POST['publisher']
         book.publication_date = request.POST['publication_date']
-        book.total_copies = request.POST['total_copies']
         book.description = request.POST.get('description', '')
+        fields = ['isbn', 'title', 'author', 'category', 'publisher', 'publication_date', 'description']
         
         if request.FILES.get('cover_image'):
             book.cover_image = request.FILES['cover_image']
+            fields.append('cover_image')
         
-        book.save()
+        # The copy counts change as deltas so loans made while the form was
+        # open are kept; saving the loaded available_copies would undo them.
+        try:
+            with transaction.atomic():
+                book.save(update_fields=fields)
+                # The Book post_save signal has bumped the catalog version.
+                circulation.set_total_copies(book, int(request.POST['total_copies']), catalog=False)
+        except circulation.CopiesOnLoan:
+            messages.error(request, "Total copies cannot be less than the copies currently issued or on hold.")
+            return redirect(f'/edit_book/{book.id}/')
+        if request.FILES.get('cover_image'):
+            tasks.run_in_background(images.generate_variants, book.cover_image.name)
         messages.success(request, f"Book '{book.title}' updated successfully!")
         return redirect('/view_books')
     
@@ -214,7 +289,19 @@ def delete_book(request, book_id):
     
     book = get_object_or_404(Book, id=book_id)
     title = book.title
-    book.delete()
+    with transaction.atomic():
+        borrowers = list(IssuedBook.objects.filter(book=book, is_returned=False).values_list('student_id', flat=True))
+        active_loans = len(borrowers)
+        affected = set(borrowers)
+        affected.update(BookReservation.objects.filter(book=book, is_active=True).values_list('student_id', flat=True))
+        book.delete()
+        # The Book post_delete signal has bumped the catalog version.
+        stats.increment({
+            StatCounter.BOOKS: -1,
+            StatCounter.AVAILABLE_COPIES: -book.available_copies,
+            StatCounter.ACTIVE_LOANS: -active_loans,
+        }, catalog=False)
+        summaries.refresh(*affected)
     messages.success(request, f"Book '{title}' deleted successfully!")
     return redirect('/view_books')
 
@@ -236,29 +323,59 @@ def add_student(request):
         year = request.POST['year']
         profile_picture = request.FILES.get('profile_picture')
         
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            password=password,
-            first_name=first_name,
-            last_name=last_name
-        )
-        
-        student = Student.objects.create(
-            user=user,
-            student_id=student_id,
-            phone=phone,
-            address=address,
-            department=department,
-            year=year,
-            profile_picture=profile_picture
-        )
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username=username,
+                email=email,
+                password=password,
+                first_name=first_name,
+                last_name=last_name
+            )
+            
+            student = Student.objects.create(
+                user=user,
+                student_id=student_id,
+                phone=phone,
+                address=address,
+                department=department,
+                year=year,
+                profile_picture=profile_picture
+            )
+            stats.increment({StatCounter.STUDENTS: 1})
+            if student.profile_picture:
+                tasks.run_in_background(images.generate_variants, student.profile_picture.name)
         
         messages.success(request, f"Student '{student_id}' added successfully!")
         return redirect('/view_students')
     
     return render(request, 'library/add_student.html')
 
+@login_required(login_url='/admin_login')
+def enroll_students(request):
+    if not request.user.is_superuser:
+        return redirect('/')
+    
+    if request.method == "POST":
+        roster = request.FILES.get('roster')
+        if roster is None:
+            messages.error(request, "Choose a roster file to upload.")
+            return render(request, 'library/enroll_students.html')
+        os.makedirs(settings.ENROLLMENT_DIR, exist_ok=True)
+        name = f"{datetime.now():%Y%m%d%H%M%S}_{os.path.basename(roster.name)}"
+        report_path = os.path.join(settings.ENROLLMENT_DIR, f"{name}.report.jsonl")
+        # The roster holds plaintext passwords: keep it in a private temp file
+        # that the task deletes, and keep only the report.
+        handle, path = tempfile.mkstemp(suffix=os.path.splitext(roster.name)[1])
+        with os.fdopen(handle, 'wb') as destination:
+            for chunk in roster.chunks():
+                destination.write(chunk)
+        
+        tasks.run_in_background(enrollment.enroll_upload, path, report_path=report_path)
+        messages.success(request, f"Enrollment of '{roster.name}' started. The report will be written to {report_path}.")
+        return redirect('/view_students')
+    
+    return render(request, 'library/enroll_students.html')
+
 @login_required(login_url='/admin_login')
 def view_students(request):
     if not request.user.is_superuser:
@@ -267,7 +384,7 @@ def view_students(request):
     search_query = request.GET.get('search', '')
     department_filter = request.GET.get('department', '')
     
-    students = Student.objects.all()
+    students = Student.objects.select_related('user')
     
     if search_query:
         students = students.filter(
@@ -279,9 +396,8 @@ def view_students(request):
     if department_filter:
         students = students.filter(department=department_filter)
     
-    paginator = Paginator(students, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(students, 10, total_count='estimate')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     departments = Student.objects.values_list('department', flat=True).distinct()
     
@@ -316,6 +432,8 @@ def edit_student(request, student_id):
             student.profile_picture = request.FILES['profile_picture']
         
         student.save()
+        if request.FILES.get('profile_picture'):
+            tasks.run_in_background(images.generate_variants, student.profile_picture.name)
         messages.success(request, f"Student '{student.student_id}' updated successfully!")
         return redirect('/view_students')
     
@@ -328,7 +446,14 @@ def delete_student(request, student_id):
     
     student = get_object_or_404(Student, id=student_id)
     student_id_num = student.student_id
-    student.user.delete()
+    with transaction.atomic():
+        active_loans = IssuedBook.objects.filter(student=student, is_returned=False).count()
+        circulation.release_holds(BookReservation.objects.filter(student=student), BookReservation.CANCELLED)
+        waiting = BookReservation.objects.filter(student=student, status=BookReservation.WAITING).exists()
+        student.user.delete()
+        if waiting:
+            catalog_cache.bump()
+        stats.increment({StatCounter.STUDENTS: -1, StatCounter.ACTIVE_LOANS: -active_loans})
     messages.success(request, f"Student '{student_id_num}' deleted successfully!")
     return redirect('/view_students')
 
@@ -345,32 +470,42 @@ def issue_book(request):
         book = get_object_or_404(Book, id=book_id)
         student = get_object_or_404(Student, student_id=student_id)
         
-        if book.available_copies > 0:
-            due_date = datetime.now().date() + timedelta(days=days)
-            
-            issued_book = IssuedBook.objects.create(
-                book=book,
-                student=student,
-                due_date=due_date
-            )
-            
-            book.available_copies -= 1
-            book.save()
-            
-            messages.success(request, f"Book '{book.title}' issued to {student.student_id} successfully!")
-            return redirect('/issued_books')
-        else:
-            messages.error(request, "No copies available for this book!")
+        try:
+            circulation.checkout(book, student, days=days)
+        except circulation.NoCopiesAvailable:
+            messages.error(request, "No copies available for this book! Copies on hold can only be issued to the student holding them.")
             return redirect('/issue_book')
+        
+        messages.success(request, f"Book '{book.title}' issued to {student.student_id} successfully!")
+        return redirect('/issued_books')
     
-    books = Book.objects.filter(available_copies__gt=0)
-    students = Student.objects.filter(is_active=True)
+    return render(request, 'library/issue_book.html')
+
+def _autocomplete_limit(request):
+    try:
+        limit = int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT))
+    except ValueError:
+        limit = autocomplete.DEFAULT_LIMIT
+    return max(1, min(limit, autocomplete.MAX_LIMIT))
+
+@login_required(login_url='/admin_login')
+@conditional.etag(conditional.counters)
+def autocomplete_books(request):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': "Admin access required."}, status=403)
     
-    context = {
-        'books': books,
-        'students': students,
-    }
-    return render(request, 'library/issue_book.html', context)
+    query = request.GET.get('q', '')
+    results = autocomplete.suggest_books(query, _autocomplete_limit(request)) if query.strip() else []
+    return JsonResponse({'results': results})
+
+@login_required(login_url='/admin_login')
+def autocomplete_students(request):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': "Admin access required."}, status=403)
+    
+    query = request.GET.get('q', '')
+    results = autocomplete.suggest_students(query, _autocomplete_limit(request)) if query.strip() else []
+    return JsonResponse({'results': results})
 
 @login_required(login_url='/admin_login')
 def issued_books(request):
@@ -381,110 +516,261 @@ def issued_books(request):
     status_filter = request.GET.get('status', 'active')
     
     if status_filter == 'active':
-        issued_books_list = IssuedBook.objects.filter(is_returned=False)
+        sources = [IssuedBook.objects.filter(is_returned=False)]
     elif status_filter == 'returned':
-        issued_books_list = IssuedBook.objects.filter(is_returned=True)
+        sources = [IssuedBook.objects.filter(is_returned=True), IssuedBookArchive.objects.all()]
     else:
-        issued_books_list = IssuedBook.objects.all()
+        sources = [IssuedBook.objects.all(), IssuedBookArchive.objects.all()]
     
     if search_query:
-        issued_books_list = issued_books_list.filter(
-            Q(book__title__icontains=search_query) |
-            Q(student__student_id__icontains=search_query)
-        )
+        sources = [
+            loans.filter(
+                Q(book__title__icontains=search_query) |
+                Q(student__student_id__icontains=search_query)
+            )
+            for loans in sources
+        ]
     
-    for issued_book in issued_books_list:
-        if not issued_book.is_returned:
-            issued_book.calculate_fine()
+    sources = [loans.select_related('book', 'student__user') for loans in sources]
     
-    paginator = Paginator(issued_books_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if len(sources) == 1:
+        paginator = CursorPaginator(sources[0], 10, total_count='estimate')
+    else:
+        paginator = MergedCursorPaginator(sources, 10, total_count='estimate')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'status_filter': status_filter,
+        'today': datetime.now().date(),
     }
     return render(request, 'library/issued_books.html', context)
 
 @login_required(login_url='/admin_login')
-def return_book(request, issue_id):
+def export_issued_books(request):
     if not request.user.is_superuser:
         return redirect('/')
     
-    issued_book = get_object_or_404(IssuedBook, id=issue_id)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.WRITERS:
+        return HttpResponse("Unknown export format.", status=400)
+    try:
+        date_from = datetime.strptime(request.GET['from'], '%Y-%m-%d').date() if request.GET.get('from') else None
+        date_to = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if request.GET.get('to') else None
+    except ValueError:
+        return HttpResponse("Dates must be YYYY-MM-DD.", status=400)
+    
+    loans = exports.filter_loans(
+        request.GET.get('status', 'all'),
+        date_from,
+        date_to,
+        request.GET.get('search', ''),
+    )
+    lines, content_type = exports.WRITERS[export_format]
+    response = StreamingHttpResponse(lines(exports.loan_rows(loans)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="circulation_history.{export_format}"'
+    return response
+
+REPORT_DAYS = 30
+
+def _report_range(request):
+    """The inclusive (from, to) dates asked for, defaulting to the last REPORT_DAYS days."""
+    date_to = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if request.GET.get('to') else datetime.now().date()
+    if request.GET.get('from'):
+        date_from = datetime.strptime(request.GET['from'], '%Y-%m-%d').date()
+    else:
+        date_from = date_to - timedelta(days=REPORT_DAYS - 1)
+    if date_from > date_to:
+        raise ValueError("from is after to")
+    return date_from, date_to
+
+@login_required(login_url='/admin_login')
+def circulation_reports(request):
+    if not request.user.is_superuser:
+        return redirect('/')
+    try:
+        date_from, date_to = _report_range(request)
+    except ValueError:
+        return HttpResponse("Dates must be YYYY-MM-DD, with from on or before to.", status=400)
+    report = reports.report(date_from, date_to)
+    context = {
+        'report': report,
+        'sections': [
+            ("By Month", "Month", [(row['month'].strftime('%b %Y'), row) for row in report['by_month']]),
+            ("By Category", "Category", [(row['category'], row) for row in report['by_category']]),
+            ("By Department", "Department", [(row['department'], row) for row in report['by_department']]),
+        ],
+    }
+    return render(request, 'library/reports.html', context)
+
+@login_required(login_url='/admin_login')
+def circulation_reports_api(request):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': "Admin access required."}, status=403)
+    try:
+        date_from, date_to = _report_range(request)
+    except ValueError:
+        return JsonResponse({'error': "Dates must be YYYY-MM-DD, with from on or before to."}, status=400)
+    return JsonResponse(reports.report(date_from, date_to))
+
+CART_LIMIT = 50
+
+@login_required(login_url='/admin_login')
+@require_POST
+def circulation_cart(request):
+    """Issue or return a scanned stack of books in one request.
+
+    Takes {"action": "checkout", "student_id": ..., "isbns": [...], "days": 14}
+    or {"action": "return", "issue_ids": [...]} and answers with one result
+    per item.
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'error': "Admin access required."}, status=403)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': "Request body must be JSON."}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': "Request body must be a JSON object."}, status=400)
+    
+    action = payload.get('action')
+    if action == 'checkout':
+        isbns = payload.get('isbns')
+        if not isinstance(isbns, list) or not all(isinstance(isbn, str) for isbn in isbns):
+            return JsonResponse({'error': "isbns must be a list of strings."}, status=400)
+        try:
+            days = int(payload.get('days', 14))
+        except (TypeError, ValueError):
+            return JsonResponse({'error': "days must be a number."}, status=400)
+        student = Student.objects.filter(student_id=payload.get('student_id')).first()
+        if student is None:
+            return JsonResponse({'error': "Student not found."}, status=404)
+        if not student.is_active:
+            return JsonResponse({'error': "Student account is inactive."}, status=400)
+        items = [isbn.strip().replace('-', '') for isbn in isbns]
+    elif action == 'return':
+        items = payload.get('issue_ids')
+        if not isinstance(items, list) or not all(type(issue_id) is int for issue_id in items):
+            return JsonResponse({'error': "issue_ids must be a list of integers."}, status=400)
+    else:
+        return JsonResponse({'error': "action must be 'checkout' or 'return'."}, status=400)
+    if not items or len(items) > CART_LIMIT:
+        return JsonResponse({'error': f"A cart holds 1 to {CART_LIMIT} items."}, status=400)
     
-    if not issued_book.is_returned:
-        issued_book.is_returned = True
-        issued_book.return_date = datetime.now().date()
-        issued_book.calculate_fine()
-        issued_book.save()
-        
-        book = issued_book.book
-        book.available_copies += 1
-        book.save()
-        
-        messages.success(request, f"Book '{book.title}' returned successfully!")
+    if action == 'checkout':
+        results = circulation.checkout_cart(student, items, days=days)
     else:
+        results = circulation.return_cart(items)
+    return JsonResponse({'results': results})
+
+@login_required(login_url='/admin_login')
+def return_book(request, issue_id):
+    if not request.user.is_superuser:
+        return redirect('/')
+    
+    issued_book = get_object_or_404(IssuedBook.objects.select_related('book'), id=issue_id)
+    
+    try:
+        circulation.return_book(issued_book)
+        messages.success(request, f"Book '{issued_book.book.title}' returned successfully!")
+    except circulation.AlreadyReturned:
         messages.error(request, "This book has already been returned!")
     
     return redirect('/issued_books')
 
-def search_books(request):
-    search_query = request.GET.get('search', '')
-    category_filter = request.GET.get('category', '')
-    
-    books = Book.objects.filter(available_copies__gt=0)
+def _catalog_query(request):
+    """(search, category, cursor, can_reserve) for a search_books request."""
+    can_reserve = request.user.is_authenticated and not request.user.is_superuser
+    return request.GET.get('search', ''), request.GET.get('category', ''), request.GET.get('cursor'), can_reserve
+
+def _catalog_paginator(search_query, category_filter):
+    # Books with no copy on the shelf stay listed so students can join their waitlist.
+    books = circulation.with_waitlist(Book.objects.all())
     
     if search_query:
-        books = books.filter(
-            Q(title__icontains=search_query) |
-            Q(author__icontains=search_query) |
-            Q(isbn__icontains=search_query)
-        )
+        books = search.search_books(books, search_query)
     
     if category_filter:
         books = books.filter(category=category_filter)
     
-    paginator = Paginator(books, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    categories = Book.CATEGORY_CHOICES
-    
-    context = {
+    return CursorPaginator(books, 12)
+
+def _render_grid(page_obj, search_query, category_filter, can_reserve):
+    return render_to_string('library/catalog_grid.html', {
         'page_obj': page_obj,
         'search_query': search_query,
         'category_filter': category_filter,
-        'categories': categories,
+        'can_reserve': can_reserve,
+    })
+
+def _search_page(request, grid, search_query, category_filter):
+    context = {
+        'grid': mark_safe(grid),
+        'search_query': search_query,
+        'category_filter': category_filter,
+        'categories': Book.CATEGORY_CHOICES,
     }
     return render(request, 'library/search_books.html', context)
 
+@conditional.etag(conditional.catalog_version)
+def search_books(request):
+    search_query, category_filter, cursor, can_reserve = _catalog_query(request)
+    key = catalog_cache.grid_key(catalog_cache.version(), search_query, category_filter, cursor, can_reserve)
+    grid = catalog_cache.get(key)
+    if grid is None:
+        page_obj = _catalog_paginator(search_query, category_filter).get_page(cursor)
+        grid = _render_grid(page_obj, search_query, category_filter, can_reserve)
+        catalog_cache.set(key, grid)
+    return _search_page(request, grid, search_query, category_filter)
+
+@conditional.etag(conditional.catalog_version)
+async def asearch_books(request):
+    request.user = await request.auser()
+    search_query, category_filter, cursor, can_reserve = _catalog_query(request)
+    key = catalog_cache.grid_key(await catalog_cache.aversion(), search_query, category_filter, cursor, can_reserve)
+    grid = await catalog_cache.aget(key)
+    if grid is None:
+        if search_query:
+            # Introspects the database once per process; not on the event loop.
+            await sync_to_async(search.fts_available)()
+        page_obj = await _catalog_paginator(search_query, category_filter).aget_page(cursor)
+        grid = _render_grid(page_obj, search_query, category_filter, can_reserve)
+        await catalog_cache.aset(key, grid)
+    return _search_page(request, grid, search_query, category_filter)
+
 @login_required(login_url='/student_login')
 def reserve_book(request, book_id):
     try:
-        student = Student.objects.get(user=request.user)
+        student = request.student
+        if not student:
+            raise Student.DoesNotExist
         book = get_object_or_404(Book, id=book_id)
         
-        existing_reservation = BookReservation.objects.filter(
-            book=book,
-            student=student,
-            is_active=True
-        ).exists()
-        
-        if existing_reservation:
+        try:
+            reservation = circulation.reserve(book, student)
+        except circulation.AlreadyReserved:
             messages.error(request, "You have already reserved this book!")
         else:
-            expiry_date = datetime.now() + timedelta(days=3)
-            BookReservation.objects.create(
-                book=book,
-                student=student,
-                expiry_date=expiry_date
-            )
-            messages.success(request, f"Book '{book.title}' reserved successfully!")
+            if reservation.status == BookReservation.HELD:
+                messages.success(request, f"Book '{book.title}' reserved successfully! A copy is held for you until {reservation.expiry_date:%b %d, %Y}.")
+            else:
+                position = circulation.with_queue_position(
+                    BookReservation.objects.filter(pk=reservation.pk)
+                ).values_list('queue_position', flat=True).get()
+                messages.success(request, f"Book '{book.title}' reserved successfully! You are #{position} on the waitlist for the next returned copy.")
         
         return redirect('/search_books')
     except Student.DoesNotExist:
         messages.error(request, "Student profile not found.")
-        return redirect('/')
\ No newline at end of file
+        return redirect('/')
+
+def prometheus_metrics(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    authorized = request.user.is_superuser or (
+        token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    )
+    if not authorized:
+        return HttpResponse("Forbidden", status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
\ No newline at end of file